@@ -49,16 +49,68 @@ INSTALLED_APPS = [
 ]
 
 
+# Authenticate read requests from the signed token claims alone, without
+# loading the user (home/authentication.py)
+HOME_STATELESS_JWT = os.getenv('STATELESS_JWT', 'false').lower() == 'true'
+HOME_TOKEN_VERSION_CACHE = 'default'
+# A per-process cache only hears of bumps made in the same process, so
+# versions are kept for seconds unless the cache is shared (Redis)
+HOME_TOKEN_VERSION_TIMEOUT = 60 * 60 if os.getenv('CACHE_REDIS_URL') else 5
+
+# Blacklisted refresh tokens are looked up through home/blacklist.py: a
+# per-process Bloom filter synced every few seconds, or a Redis set shared
+# by all processes when TOKEN_BLACKLIST_REDIS_URL is set
+HOME_TOKEN_BLACKLIST_REDIS_URL = os.getenv('TOKEN_BLACKLIST_REDIS_URL')
+HOME_TOKEN_BLACKLIST_BACKEND = (
+    'home.blacklist.RedisBlacklist' if HOME_TOKEN_BLACKLIST_REDIS_URL
+    else 'home.blacklist.BloomBlacklist')
+HOME_TOKEN_BLACKLIST_SYNC_INTERVAL = 5
+# Rows blacklisted this many seconds before the last sync are read again,
+# catching transactions that commit after rows with higher ids
+HOME_TOKEN_BLACKLIST_SYNC_OVERLAP = 60
+HOME_TOKEN_BLACKLIST_CAPACITY = 10000
+HOME_TOKEN_BLACKLIST_ERROR_RATE = 0.001
+# Expired tokens deleted per transaction by home.tasks.purge_expired_tokens
+HOME_TOKEN_PURGE_CHUNK_SIZE = 1000
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'home.authentication.StatelessJWTAuthentication'
+        if HOME_STATELESS_JWT else
+        'home.authentication.ProfileJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
+    # orjson-backed when it is installed, the stdlib encoder otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'home.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'home.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Largest ?page_size= accepted by the cursor-paginated feeds
+HOME_FEED_MAX_PAGE_SIZE = 100
+
+# Pub/sub behind the /api/stream/ event stream (home/pubsub.py): in-process
+# by default, Redis when PUBSUB_REDIS_URL is set e.g. 'redis://redis:6379/2'
+HOME_PUBSUB_REDIS_URL = os.getenv('PUBSUB_REDIS_URL')
+HOME_PUBSUB_BACKEND = (
+    'home.pubsub.RedisBroker' if HOME_PUBSUB_REDIS_URL
+    else 'home.pubsub.InProcessBroker'
+)
+# Seconds between keepalive comments on an idle stream
+HOME_STREAM_HEARTBEAT = 15
+# Seconds between re-checks of the token an open stream was opened with
+HOME_STREAM_REVALIDATE_INTERVAL = 60
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'home.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,6 +119,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Smallest response body worth compressing (home/middleware.py); brotli is
+# used when the package is installed and the client accepts it
+HOME_COMPRESS_MIN_SIZE = 1024
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -188,17 +244,89 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "home.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "home.serializers.ClaimsTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 AUTH_USER_MODEL = 'home.CustomUser'
+
+# Cache: local memory by default, Redis when CACHE_REDIS_URL is set
+# e.g. 'redis://redis:6379/1'
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Project membership index (home/membership.py)
+HOME_MEMBERSHIP_CACHE = 'default'
+HOME_MEMBERSHIP_TIMEOUT = 60 * 60
+
+# Per-user cache of the project and task lists (home/response_cache.py),
+# invalidated by the signals in home/signals.py
+HOME_RESPONSE_CACHE = 'default'
+HOME_RESPONSE_CACHE_TIMEOUT = 5 * 60
+
+# Task notification fan-out (home/notifications.py): inserted in batches
+# after commit, on a Celery worker when HOME_NOTIFICATION_FANOUT_ASYNC is on
+HOME_NOTIFICATION_FANOUT_ASYNC = os.getenv(
+    'NOTIFICATION_FANOUT_ASYNC', 'false').lower() == 'true'
+HOME_NOTIFICATION_BATCH_SIZE = 1000
+
+# Updates to the same task within this many seconds are merged into one
+# timeline event and notification (0 logs every update)
+HOME_TASK_UPDATE_COALESCE_WINDOW = int(
+    os.getenv('TASK_UPDATE_COALESCE_WINDOW', '10'))
+
+# Full-text search (home/search.py): text search configuration of the
+# PostgreSQL tsvector, and the most results returned for one query
+HOME_SEARCH_CONFIG = 'english'
+HOME_SEARCH_LIMIT = 100
+
+# Most tasks accepted by one POST/PATCH to /api/task/batch/
+HOME_TASK_BATCH_MAX = 500
+
+# Projects handled per chunk by check_overdue_projects
+HOME_DEADLINE_CHUNK_SIZE = 500
+# With more than one shard, beat runs the sharded overdue scan
+# (a chord, so CELERY_RESULT_BACKEND must be set)
+HOME_DEADLINE_SHARDS = int(os.getenv('DEADLINE_SHARDS', '1'))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Sizes (px) of the profile image derivatives made by
+# home.tasks.process_profile_image_task, optionally also as WebP
+HOME_PROFILE_IMAGE_SIZES = (64, 128, 300)
+HOME_PROFILE_IMAGE_WEBP = False
+
+# Part files of resumable document uploads, kept out of MEDIA_ROOT
+HOME_UPLOAD_TEMP_DIR = BASE_DIR / 'uploads'
+
+# Document downloads (home/downloads.py) are sent by Django unless
+# offloaded to the front proxy: 'x-accel-redirect' (nginx, with an internal
+# location at HOME_DOWNLOAD_ACCEL_PREFIX aliased to MEDIA_ROOT) or
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd). Under uvicorn Django
+# streams the bytes itself; only WSGI servers (core.wsgi) get sendfile()
+HOME_DOWNLOAD_OFFLOAD = os.getenv('DOWNLOAD_OFFLOAD') or None
+HOME_DOWNLOAD_ACCEL_PREFIX = '/protected/'
+
+# Garbage collection of unreferenced document blobs
+# (home.tasks.collect_unreferenced_blobs)
+HOME_BLOB_GC_GRACE = 60 * 60
+HOME_BLOB_GC_CHUNK_SIZE = 500
+
 
 # celery settings
 # CELERY_BROKER_URL = 'redis://redis:6379/0'
@@ -217,9 +345,21 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
 CELERY_BEAT_SCHEDULE = {
     'check-due-and-overdue-projects': {
-        'task': 'projects.tasks.check_overdue_projects',
+        'task': (
+            'home.tasks.check_overdue_projects_sharded'
+            if HOME_DEADLINE_SHARDS > 1
+            else 'home.tasks.check_overdue_projects'
+        ),
         'schedule': crontab(hour=0, minute=0),  # Daily at midnight
     },
+    'purge-expired-tokens': {
+        'task': 'home.tasks.purge_expired_tokens',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'collect-unreferenced-blobs': {
+        'task': 'home.tasks.collect_unreferenced_blobs',
+        'schedule': crontab(hour=3, minute=0),
+    },
     'print-heartbeat': {
         'task': 'home.tasks.print_heartbeat',
         'schedule': timedelta(seconds=6),  # Every minute
@@ -1,11 +1,23 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from django.views.static import serve
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('home.urls')),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.DEBUG:
+    # Media such as profile images, as static() would serve them. Documents
+    # are left out: they only go out through the permission checked
+    # /api/documents/<id>/download/ action.
+    urlpatterns += [
+        re_path(r'^%s(?!documents/)(?P<path>.*)$'
+                % re.escape(settings.MEDIA_URL.lstrip('/')),
+                serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
@@ -7,3 +7,9 @@ class HomeConfig(AppConfig):
 
     def ready(self):
         import home.signals
+        from django.core import checks
+        from home.pubsub import check_broker
+        checks.register(check_broker)
+        from django.db.models.signals import post_migrate
+        from home.search import create_vector_index
+        post_migrate.connect(create_vector_index, sender=self)
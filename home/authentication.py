@@ -0,0 +1,230 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .blacklist import get_blacklist, is_blacklisted
+from .cache_utils import delete_now_and_on_commit
+from .models import Profile
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that loads the user together with its profile.
+
+    The profile is fetched through ``select_related`` in the same query as
+    the user, so ``request.user.profile`` (and the role on it) is available
+    to views, permissions and serializers for the rest of the request
+    without any further lookups.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification"))
+
+        try:
+            user = self.user_model.objects.select_related('profile').get(
+                **{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(
+                _("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."),
+                    code="password_changed"
+                )
+
+        return user
+
+
+ROLE_CLAIM = 'role'
+PROFILE_ID_CLAIM = 'profile_id'
+IS_ACTIVE_CLAIM = 'is_active'
+IS_SUPERUSER_CLAIM = 'is_superuser'
+IS_STAFF_CLAIM = 'is_staff'
+TOKEN_VERSION_CLAIM = 'token_version'
+TOKEN_VERSION_KEY_PREFIX = 'home:token_version:'
+
+
+def _version_cache():
+    return caches[getattr(settings, 'HOME_TOKEN_VERSION_CACHE', 'default')]
+
+
+def current_token_version(user_id):
+    """
+    Token version of ``user_id``, from the cache when possible. None if
+    the user does not exist.
+    """
+    cache = _version_cache()
+    key = f'{TOKEN_VERSION_KEY_PREFIX}{user_id}'
+    version = cache.get(key)
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id).values_list(
+            'token_version', flat=True).first()
+        if version is not None:
+            cache.set(key, version, getattr(
+                settings, 'HOME_TOKEN_VERSION_TIMEOUT', 60 * 60))
+    return version
+
+
+def bump_token_version(user_ids):
+    """
+    Invalidate the tokens issued to ``user_ids`` so far. Returns the new
+    versions by user id.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    users = get_user_model().objects.filter(pk__in=user_ids)
+    users.update(token_version=F('token_version') + 1)
+    versions = dict(users.values_list('pk', 'token_version'))
+    delete_now_and_on_commit(_version_cache(), [
+        f'{TOKEN_VERSION_KEY_PREFIX}{user_id}' for user_id in user_ids])
+    return versions
+
+
+def add_claims(token, user):
+    token[IS_ACTIVE_CLAIM] = user.is_active
+    token[IS_SUPERUSER_CLAIM] = user.is_superuser
+    token[IS_STAFF_CLAIM] = user.is_staff
+    token[ROLE_CLAIM] = user.profile.role
+    token[PROFILE_ID_CLAIM] = user.profile.pk
+    token[TOKEN_VERSION_CLAIM] = user.token_version
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the claims ``StatelessJWTAuthentication``
+    reads. Access tokens made from it get the user's current claims, so
+    refreshing picks up role and flag changes.
+
+    Blacklist checks go through ``home.blacklist`` instead of querying
+    the blacklist table on every refresh.
+    """
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        get_blacklist().add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        add_claims(token, user)
+        token._claims_user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = getattr(self, '_claims_user', None)
+        if user is None:
+            user = get_user_model().objects.select_related('profile').get(
+                **{api_settings.USER_ID_FIELD:
+                   self[api_settings.USER_ID_CLAIM]})
+        add_claims(access, user)
+        return access
+
+
+def _from_claims(model, **values):
+    """
+    Instance of ``model`` with only ``values`` loaded; other fields are
+    deferred, so reading one loads it and ``save()`` only writes these.
+    """
+    field_names = [field.attname for field in model._meta.concrete_fields
+                   if field.attname in values]
+    return model.from_db(
+        'default', field_names, [values[name] for name in field_names])
+
+
+class StatelessJWTAuthentication(ProfileJWTAuthentication):
+    """
+    JWT authentication that builds the user and profile of read requests
+    from the token claims, without loading either.
+
+    The claims are trusted as long as the token's version matches the
+    user's current one (a cache lookup); changing the role, the active
+    flag, the staff flag or the superuser flag bumps the version. Other
+    methods, and tokens issued without the claims, load the user as
+    usual.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if request.method in SAFE_METHODS:
+            user = self.get_claims_user(validated_token)
+            if user is not None:
+                return user, validated_token
+        return self.get_user(validated_token), validated_token
+
+    def check_version(self, validated_token, version):
+        if validated_token.get(TOKEN_VERSION_CLAIM, version) != version:
+            raise AuthenticationFailed(
+                _("Token is no longer valid."), code="token_outdated")
+
+    def get_claims_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+            claims = {name: validated_token[name] for name in (
+                IS_ACTIVE_CLAIM, IS_SUPERUSER_CLAIM, IS_STAFF_CLAIM,
+                ROLE_CLAIM, PROFILE_ID_CLAIM, TOKEN_VERSION_CLAIM)}
+        except KeyError:
+            return None
+
+        version = current_token_version(user_id)
+        if version is None:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found")
+        self.check_version(validated_token, version)
+        if api_settings.CHECK_USER_IS_ACTIVE and not claims[IS_ACTIVE_CLAIM]:
+            raise AuthenticationFailed(
+                _("User is inactive"), code="user_inactive")
+
+        user = _from_claims(
+            self.user_model,
+            **{self.user_model._meta.pk.attname: user_id},
+            is_active=claims[IS_ACTIVE_CLAIM],
+            is_superuser=claims[IS_SUPERUSER_CLAIM],
+            is_staff=claims[IS_STAFF_CLAIM],
+            token_version=version)
+        profile = _from_claims(
+            Profile, id=claims[PROFILE_ID_CLAIM], user_id=user_id,
+            role=claims[ROLE_CLAIM])
+        # Also caches the profile on ``user.profile``.
+        profile.user = user
+        return user
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        self.check_version(validated_token, user.token_version)
+        return user
@@ -0,0 +1,178 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+def _blacklisted_jtis(id_gt=0, since=None):
+    """
+    ``(id, jti)`` of the unexpired blacklisted tokens with an id above
+    ``id_gt`` or blacklisted at or after ``since``, in id order.
+    """
+    rows = Q(id__gt=id_gt)
+    if since is not None:
+        rows |= Q(blacklisted_at__gte=since)
+    return (BlacklistedToken.objects
+            .filter(rows, token__expires_at__gt=timezone.now())
+            .order_by('id').values_list('id', 'token__jti'))
+
+
+def in_database(jti):
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.capacity = capacity
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position // 8] & (1 << (position % 8))
+                   for position in self._positions(item))
+
+
+class BloomBlacklist:
+    """
+    Per-process Bloom filter of the blacklisted jtis.
+
+    A jti the filter does not contain is not blacklisted, which answers
+    almost every lookup without a query; hits are confirmed in the
+    database. The filter picks up tokens blacklisted by other processes
+    every ``HOME_TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds, and is rebuilt
+    from the table once it holds more jtis than it was sized for.
+
+    Ids are handed out before commit, so a row can become visible after
+    rows with higher ids; each sync also re-reads the rows blacklisted
+    within ``HOME_TOKEN_BLACKLIST_SYNC_OVERLAP`` seconds of the last one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.last_id = 0
+        self.synced_at = 0
+        self.synced_since = None
+
+    def _build(self):
+        rows = list(_blacklisted_jtis())
+        bloom = BloomFilter(
+            capacity=max(2 * len(rows), getattr(
+                settings, 'HOME_TOKEN_BLACKLIST_CAPACITY', 10000)),
+            error_rate=getattr(
+                settings, 'HOME_TOKEN_BLACKLIST_ERROR_RATE', 0.001))
+        for _, jti in rows:
+            bloom.add(jti)
+        self.filter = bloom
+        self.last_id = rows[-1][0] if rows else 0
+
+    def _sync(self):
+        interval = getattr(settings, 'HOME_TOKEN_BLACKLIST_SYNC_INTERVAL', 5)
+        now = time.monotonic()
+        if self.filter is not None and now - self.synced_at < interval:
+            return
+        with self.lock:
+            since = timezone.now() - timedelta(seconds=getattr(
+                settings, 'HOME_TOKEN_BLACKLIST_SYNC_OVERLAP', 60))
+            if self.filter is None or self.filter.count > self.filter.capacity:
+                self._build()
+            else:
+                rows = _blacklisted_jtis(self.last_id, self.synced_since)
+                for row_id, jti in rows:
+                    # Re-read rows must not count twice towards capacity.
+                    if jti not in self.filter:
+                        self.filter.add(jti)
+                    self.last_id = max(self.last_id, row_id)
+            self.synced_at = now
+            self.synced_since = since
+
+    def add(self, jti):
+        self._sync()
+        with self.lock:
+            self.filter.add(jti)
+
+    def remove(self, jtis):
+        # Bloom filters cannot forget; purged jtis go at the next rebuild.
+        pass
+
+    def contains(self, jti):
+        self._sync()
+        return jti in self.filter and in_database(jti)
+
+
+class RedisBlacklist:
+    """
+    Blacklisted jtis kept in a Redis set shared by every process, loaded
+    from the table when the set is missing.
+    """
+
+    def __init__(self, url=None):
+        import redis
+        self.client = redis.Redis.from_url(
+            url or settings.HOME_TOKEN_BLACKLIST_REDIS_URL)
+        self.key = getattr(settings, 'HOME_TOKEN_BLACKLIST_KEY',
+                           'home:blacklisted_jtis')
+        self.ready_key = self.key + ':ready'
+
+    def _ensure_loaded(self):
+        if self.client.exists(self.ready_key):
+            return
+        jtis = [jti for _, jti in _blacklisted_jtis()]
+        pipeline = self.client.pipeline()
+        for start in range(0, len(jtis), 1000):
+            pipeline.sadd(self.key, *jtis[start:start + 1000])
+        pipeline.set(self.ready_key, 1)
+        pipeline.execute()
+
+    def add(self, jti):
+        self._ensure_loaded()
+        self.client.sadd(self.key, jti)
+
+    def remove(self, jtis):
+        if jtis:
+            self.client.srem(self.key, *jtis)
+
+    def contains(self, jti):
+        self._ensure_loaded()
+        return bool(self.client.sismember(self.key, jti))
+
+
+_blacklist = None
+
+
+def get_blacklist():
+    """
+    Return the lookup layer named by ``HOME_TOKEN_BLACKLIST_BACKEND``.
+    """
+    global _blacklist
+    if _blacklist is None:
+        _blacklist = import_string(getattr(
+            settings, 'HOME_TOKEN_BLACKLIST_BACKEND',
+            'home.blacklist.BloomBlacklist'))()
+    return _blacklist
+
+
+def is_blacklisted(jti):
+    return get_blacklist().contains(jti)
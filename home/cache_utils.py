@@ -0,0 +1,17 @@
+from django.db import transaction
+
+
+def delete_now_and_on_commit(cache, keys):
+    """
+    Delete ``keys`` from ``cache`` straight away and again once the
+    surrounding transaction commits.
+
+    The first delete stops readers from using the old entries; the second
+    drops whatever a read made inside the transaction, still seeing the
+    old rows, stored in the meantime.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,85 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin answering ``If-None-Match``/``If-Modified-Since`` on
+    list and retrieve with ``304 Not Modified``.
+
+    The validators come from one aggregate query (the newest of the
+    ``conditional_fields`` timestamps and the row count) over the same
+    queryset the action would serialize, so a 304 costs no instances
+    and no serialization. The ETag also covers the caller and their role,
+    which the serializers may render, and the query string.
+    """
+    conditional_fields = ('updated_at',)
+
+    def get_validators(self, queryset):
+        aggregates = {f'max_{i}': Max(field)
+                      for i, field in enumerate(self.conditional_fields)}
+        values = queryset.order_by().aggregate(
+            count=Count('pk', distinct=True), **aggregates)
+        if not values['count']:
+            return None, None
+        timestamps = [value for key, value in values.items()
+                      if key.startswith('max_') and value is not None]
+        last_modified = max(timestamps) if timestamps else None
+
+        user = self.request.user
+        profile = getattr(user, 'profile', None)
+        key = '|'.join(str(part) for part in (
+            queryset.model._meta.label, self.action, values['count'],
+            *(values[key] for key in aggregates), user.pk,
+            user.is_superuser, getattr(profile, 'role', ''),
+            self.request.META.get('QUERY_STRING', ''),
+        ))
+        etag = quote_etag(hashlib.sha256(key.encode()).hexdigest())
+        return etag, last_modified
+
+    def conditional_response(self, queryset, view, request, *args,
+                             check_last_modified=True, **kwargs):
+        etag, last_modified = self.get_validators(queryset)
+        if etag is None:
+            return view(request, *args, **kwargs)
+        timestamp = (int(last_modified.timestamp()) if last_modified
+                     else None)
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=timestamp if check_last_modified else None)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Per-user content that clients must revalidate before reuse.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # A deleted row lowers the count but not the newest timestamp, so
+        # lists are only validated by ETag.
+        return self.conditional_response(
+            queryset, super().list, request, *args,
+            check_last_modified=False, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            queryset = queryset.filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            # As get_object_or_404 does for lookups of the wrong type.
+            raise Http404
+        return self.conditional_response(
+            queryset, super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,162 @@
+import hashlib
+import posixpath
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.http import HttpResponseNotModified
+from django.utils.http import content_disposition_header
+from django.utils.http import parse_etags, quote_etag
+
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` byte positions (inclusive) asked for by a
+    ``Range`` header, or None to send the whole file.
+
+    Only single ranges are served; anything else gets the whole file,
+    which RFC 9110 allows. Raises RangeNotSatisfiable when the range
+    starts past the end of the file.
+    """
+    match = RANGE.match((header or '').strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def document_etag(document):
+    """
+    Strong ETag of a document file. Content-addressed names carry the
+    sha256 of the bytes; older files fall back to name, size and mtime.
+    """
+    storage = document.file.storage
+    name = document.file.name
+    digest = getattr(storage, 'content_digest', lambda name: None)(name)
+    if digest is None:
+        digest = hashlib.sha256(
+            f'{name}:{storage.size(name)}:'
+            f'{storage.get_modified_time(name).timestamp()}'.encode()
+        ).hexdigest()
+    return quote_etag(digest)
+
+
+def _etag_matches(header, etag):
+    etags = parse_etags(header or '')
+    return '*' in etags or etag in etags
+
+
+class _RangeFile:
+    """
+    File wrapper that reads at most ``length`` bytes from the current
+    position. ``fileno`` is kept so WSGI servers with a file wrapper can
+    still use sendfile(), bounded by the response's Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _offloaded(document):
+    """
+    Hand the transfer to the front proxy when ``HOME_DOWNLOAD_OFFLOAD``
+    is set; the proxy then also answers Range requests itself.
+    """
+    offload = getattr(settings, 'HOME_DOWNLOAD_OFFLOAD', None)
+    if offload == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = posixpath.join(
+            getattr(settings, 'HOME_DOWNLOAD_ACCEL_PREFIX', '/protected/'),
+            document.file.name)
+    elif offload == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = document.file.path
+    else:
+        return None
+    # Let the proxy work out the type from the file.
+    del response['Content-Type']
+    return response
+
+
+def serve_document(request, document):
+    """
+    Response sending the file of ``document``, honouring
+    ``If-None-Match``, ``Range`` and ``If-Range``.
+    """
+    etag = document_etag(document)
+    # Blob names are digests; name the download after the document.
+    extension = posixpath.splitext(document.file.name)[1]
+    filename = f'{document.name}{extension}'
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    response = _offloaded(document)
+    if response is not None:
+        # Escaped and RFC 5987 encoded like FileResponse does it.
+        response['Content-Disposition'] = content_disposition_header(
+            True, filename)
+        response['ETag'] = etag
+        return response
+
+    size = document.file.size
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = None
+        if if_range is None or if_range == etag:
+            byte_range = parse_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = document.file.storage.open(document.file.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(_RangeFile(file, end - start + 1),
+                                as_attachment=True, filename=filename,
+                                status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
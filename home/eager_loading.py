@@ -0,0 +1,122 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class EagerLoadingPlan:
+    """
+    The ``select_related``/``prefetch_related``/``only`` calls needed to
+    serialize a queryset without issuing a query per row.
+    """
+
+    def __init__(self):
+        self.select = []
+        self.prefetch = []
+        self.only = []
+        # Set when a field reads something that is not a concrete column
+        # (method fields, properties, ...); ``only()`` is skipped then.
+        self.restrict_columns = True
+
+    def apply(self, queryset, restrict_columns=True):
+        if self.select:
+            queryset = queryset.select_related(*self.select)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        if restrict_columns and self.restrict_columns and self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def build_plan(serializer, model, plan=None, prefix=''):
+    """
+    Walk the declared fields of ``serializer`` and record which relations
+    of ``model`` have to be joined or prefetched to render them.
+    """
+    if plan is None:
+        plan = EagerLoadingPlan()
+    plan.only.append(prefix + model._meta.pk.name)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or len(field.source_attrs) != 1:
+            plan.restrict_columns = False
+            continue
+
+        model_field = _model_field(model, field.source_attrs[0])
+        if model_field is None:
+            plan.restrict_columns = False
+            continue
+        path = prefix + model_field.name
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            child_model = getattr(getattr(child, 'Meta', None), 'model', None)
+            if child_model is None:
+                plan.prefetch.append(path)
+            else:
+                child_plan = build_plan(child, child_model)
+                plan.prefetch.append(Prefetch(
+                    path,
+                    queryset=child_plan.apply(
+                        child_model._default_manager.all(),
+                        restrict_columns=False),
+                ))
+        elif isinstance(field, serializers.BaseSerializer):
+            # Nested single object: join it and plan its own fields.
+            plan.select.append(path)
+            plan.only.append(path)
+            child_model = getattr(
+                getattr(field, 'Meta', None), 'model',
+                model_field.related_model)
+            build_plan(field, child_model, plan, prefix=path + '__')
+        elif isinstance(field, serializers.ManyRelatedField):
+            plan.prefetch.append(path)
+        elif isinstance(field, serializers.RelatedField):
+            if model_field.many_to_many or model_field.one_to_many:
+                plan.prefetch.append(path)
+                continue
+            if not field.use_pk_only_optimization():
+                plan.select.append(path)
+            if model_field.concrete:
+                plan.only.append(path)
+        elif model_field.concrete and not model_field.many_to_many:
+            plan.only.append(path)
+        else:
+            plan.restrict_columns = False
+
+    return plan
+
+
+def optimize_queryset(queryset, serializer, restrict_columns=True):
+    """
+    Return ``queryset`` with the eager loading needed by ``serializer``.
+    """
+    plan = build_plan(serializer, queryset.model)
+    return plan.apply(queryset, restrict_columns=restrict_columns)
+
+
+class EagerLoadingMixin:
+    """
+    Viewset mixin that plans eager loading from the serializer's fields.
+
+    Applied in ``filter_queryset`` so it covers list, retrieve and the
+    object lookups of custom actions. Columns are only restricted with
+    ``only()`` on safe requests, because saving a partially loaded
+    instance would write back just the loaded fields.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return optimize_queryset(
+            queryset,
+            self.get_serializer(),
+            restrict_columns=self.request.method in ('GET', 'HEAD'),
+        )
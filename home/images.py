@@ -0,0 +1,63 @@
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+
+DERIVATIVES_DIR = 'profile_pics/derivatives'
+
+
+def file_digest(field_file, chunk_size=64 * 1024):
+    """
+    SHA-256 of a stored file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with field_file.storage.open(field_file.name, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_name(digest, size, extension='jpg'):
+    return posixpath.join(DERIVATIVES_DIR, digest, f'{size}.{extension}')
+
+
+def derivative_formats():
+    formats = [('jpg', 'JPEG')]
+    if getattr(settings, 'HOME_PROFILE_IMAGE_WEBP', False):
+        formats.append(('webp', 'WEBP'))
+    return formats
+
+
+def make_derivatives(field_file, digest):
+    """
+    Write the sized copies of an image under its content hash, leaving
+    the original untouched. Returns the names written.
+
+    The image is decoded once: draft mode lets JPEGs decode straight at
+    the smallest scale that still covers the largest size, and every
+    smaller size is scaled down from the previous one.
+    """
+    storage = field_file.storage
+    sizes = sorted(
+        getattr(settings, 'HOME_PROFILE_IMAGE_SIZES', (64, 128, 300)),
+        reverse=True)
+    names = []
+    with storage.open(field_file.name, 'rb') as fh:
+        image = Image.open(fh)
+        image.draft('RGB', (sizes[0], sizes[0]))
+        image = image.convert('RGB')
+
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        for extension, image_format in derivative_formats():
+            name = derivative_name(digest, size, extension)
+            if storage.exists(name):
+                continue
+            buffer = BytesIO()
+            image.save(buffer, image_format, quality=85)
+            names.append(storage.save(name, ContentFile(buffer.getvalue())))
+    return names
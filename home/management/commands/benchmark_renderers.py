@@ -0,0 +1,81 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from home import renderers
+from home.models import CustomUser, Project, Task, TimelineEvent
+from home.renderers import FastJSONRenderer
+from home.serializers import TaskSerializer, TimelineEventSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Time JSONRenderer against FastJSONRenderer on serialized tasks and "
+        "timeline events. Builds unsaved instances, so no database is "
+        "needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=500,
+            help="Objects per rendered list (default: 500).")
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help="Renders timed per renderer (default: 50).")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        iterations = options['iterations']
+        backend = 'orjson' if renderers.orjson is not None else 'stdlib'
+        self.stdout.write(f"FastJSONRenderer backend: {backend}")
+
+        for name, data in self.payloads(rows):
+            baseline = self.time_render(JSONRenderer(), data, iterations)
+            fast = self.time_render(FastJSONRenderer(), data, iterations)
+            size = len(FastJSONRenderer().render(data))
+            self.stdout.write(
+                f"{name} ({rows} rows, {size} bytes): "
+                f"JSONRenderer {baseline * 1000:.2f} ms, "
+                f"FastJSONRenderer {fast * 1000:.2f} ms, "
+                f"{baseline / fast:.1f}x")
+
+    def payloads(self, rows):
+        now = timezone.now()
+        user = CustomUser(id=1, email='manager@example.com')
+        request = SimpleNamespace(
+            user=SimpleNamespace(profile=SimpleNamespace(role='manager')))
+        projects = [
+            Project(id=i, title=f'Project {i}', description='x' * 200,
+                    start_date=now, end_date=now)
+            for i in range(1, 11)
+        ]
+        tasks = [
+            Task(id=i, title=f'Task {i}', description='y' * 300,
+                 status='open', project=projects[i % len(projects)],
+                 assigned_by=user)
+            for i in range(1, rows + 1)
+        ]
+        events = [
+            TimelineEvent(id=i, project=projects[i % len(projects)],
+                          user=user, action='task_updated',
+                          description=f'Task {i} moved to review',
+                          created_at=now)
+            for i in range(1, rows + 1)
+        ]
+        yield 'TaskSerializer', TaskSerializer(
+            tasks, many=True, context={'request': request}).data
+        yield 'TimelineEventSerializer', TimelineEventSerializer(
+            events, many=True).data
+
+    def time_render(self, renderer, data, iterations):
+        """
+        Return the mean seconds per render of ``data``.
+        """
+        renderer.render(data)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            renderer.render(data)
+        return (time.perf_counter() - start) / iterations
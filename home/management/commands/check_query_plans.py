@@ -0,0 +1,97 @@
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from home.models import CustomUser
+from home.urls import router
+
+
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the list queryset of every API viewset and fail if "
+        "the plan sequentially scans a large table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', required=True,
+            help="Email of the user the querysets are built for.")
+        parser.add_argument(
+            '--project', type=int,
+            help="Project id passed to viewsets that filter on ?project=.")
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help="Tables with fewer estimated rows may be scanned "
+                 "(default: 10000).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("check_query_plans needs PostgreSQL.")
+        try:
+            user = CustomUser.objects.select_related('profile').get(
+                email=options['user'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user {options['user']!r}.")
+
+        params = {}
+        if options['project']:
+            params['project'] = options['project']
+
+        failures = []
+        for prefix, viewset, basename in router.registry:
+            queryset = self.list_queryset(viewset, prefix, user, params)
+            if queryset is None:
+                self.stdout.write(f"{basename}: skipped (empty queryset)")
+                continue
+            plan = queryset.explain()
+            large = [
+                table for table in SEQ_SCAN.findall(plan)
+                if self.estimated_rows(table) >= options['min_rows']
+            ]
+            if large:
+                failures.append(basename)
+                self.stdout.write(self.style.ERROR(
+                    f"{basename}: sequential scan on {', '.join(large)}"))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{basename}: ok"))
+
+        if failures:
+            raise CommandError(
+                f"Sequential scans in: {', '.join(failures)}")
+
+    def list_queryset(self, viewset, prefix, user, params):
+        """
+        Build the queryset the list action of ``viewset`` would paginate,
+        limited to the first page.
+        """
+        request = Request(APIRequestFactory().get(f'/api/{prefix}/', params))
+        request.user = user
+        view = viewset(action='list', request=request, kwargs={},
+                       format_kwarg=None)
+        queryset = view.filter_queryset(view.get_queryset())
+        paginator = view.paginator
+        ordering = getattr(paginator, 'ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        page_size = getattr(paginator, 'page_size', None) or 20
+        queryset = queryset[:page_size]
+        try:
+            str(queryset.query)
+        except EmptyResultSet:
+            return None
+        return queryset
+
+    def estimated_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+        return row[0] if row else 0
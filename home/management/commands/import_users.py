@@ -0,0 +1,224 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from home.models import CustomUser, Profile
+
+
+ROLES = {role for role, _ in Profile.ROLE_CHOICES}
+FIELDS = ('email', 'first_name', 'last_name', 'phone_number')
+
+
+def _init_worker(settings_module):
+    # Spawned workers (macOS, Windows) start without Django set up.
+    if settings_module:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _hash_password(password):
+    # None makes an unusable password, like create_user(password=None).
+    return make_password(password or None)
+
+
+def _field_errors(row):
+    """
+    Messages of the ``CustomUser`` field validators (max_length, ...)
+    the values of ``row`` fail.
+    """
+    errors = []
+    for name in FIELDS:
+        if not row[name]:
+            continue
+        try:
+            CustomUser._meta.get_field(name).run_validators(row[name])
+        except ValidationError as exc:
+            errors.append(f"{name}: {' '.join(exc.messages)}")
+    return errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV or NDJSON file (columns: email, password, "
+        "first_name, last_name, phone_number, role). Passwords are hashed "
+        "in a process pool and rows inserted in batches with bulk_create."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help="File to import, or - for standard input.")
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help="Input format (default: from the file extension, else csv).")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Users inserted per transaction (default: 1000).")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Password hashing processes (default: one per core).")
+        parser.add_argument(
+            '--role', default='developer', choices=sorted(ROLES),
+            help="Role of rows without one (default: developer).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        workers = max(1, options['workers'])
+        self.default_role = options['role']
+        self.verbosity = options['verbosity']
+        self.created = self.skipped = 0
+
+        stream = sys.stdin if path == '-' else open(
+            path, newline='', encoding='utf-8')
+        started = time.monotonic()
+        try:
+            rows = self.valid_rows(self.read_rows(stream, fmt))
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE'),),
+            ) as pool:
+                pending = None
+                while batch := list(islice(rows, batch_size)):
+                    # Hash this batch while the previous one is inserted.
+                    hashes = pool.map(
+                        _hash_password, [row['password'] for row in batch],
+                        chunksize=max(1, len(batch) // (4 * workers)))
+                    if pending:
+                        self.insert(*pending)
+                    pending = (batch, hashes)
+                if pending:
+                    self.insert(*pending)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = self.created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.created} users, skipped {self.skipped}, "
+            f"in {elapsed:.1f}s ({rate:.0f} rows/s)."))
+
+    def read_rows(self, stream, fmt):
+        """
+        Yield ``(line_number, row dict)`` from ``stream`` one at a time.
+        """
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                self.reject(line_number, f"invalid JSON ({exc})")
+                continue
+            if isinstance(row, dict):
+                yield line_number, row
+            else:
+                self.reject(line_number, "not a JSON object")
+
+    def valid_rows(self, rows):
+        """
+        Normalize the rows, dropping (and reporting) invalid ones.
+        """
+        emails, phones = set(), set()
+        for line_number, row in rows:
+            email = CustomUser.objects.normalize_email(
+                (row.get('email') or '').strip())
+            phone_number = (row.get('phone_number') or '').strip() or None
+            role = (row.get('role') or '').strip() or self.default_role
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.reject(line_number, f"invalid email {email!r}")
+                continue
+            if email in emails:
+                self.reject(line_number, f"duplicate email {email}")
+                continue
+            if phone_number and phone_number in phones:
+                self.reject(line_number,
+                            f"duplicate phone number {phone_number}")
+                continue
+            if role not in ROLES:
+                self.reject(line_number, f"unknown role {role!r}")
+                continue
+            valid = {
+                'line_number': line_number,
+                'email': email,
+                'password': row.get('password') or '',
+                'first_name': (row.get('first_name') or '').strip(),
+                'last_name': (row.get('last_name') or '').strip(),
+                'phone_number': phone_number,
+                'role': role,
+            }
+            # A value the column cannot hold would fail the whole batch.
+            errors = _field_errors(valid)
+            if errors:
+                self.reject(line_number, '; '.join(errors))
+                continue
+            emails.add(email)
+            if phone_number:
+                phones.add(phone_number)
+            yield valid
+
+    def reject(self, line_number, reason):
+        self.skipped += 1
+        self.stderr.write(f"Line {line_number}: {reason}, skipped.")
+
+    def insert(self, batch, hashes):
+        """
+        Create the users of ``batch`` and their profiles. Rows whose email
+        or phone number is already taken are skipped.
+
+        bulk_create sends no post_save, so ``create_profile`` does not
+        run; the profiles are bulk created here instead.
+        """
+        hashes = list(hashes)
+        taken = set()
+        for email, phone_number in CustomUser.objects.filter(
+            Q(email__in=[row['email'] for row in batch])
+            | Q(phone_number__in=[row['phone_number'] for row in batch
+                                  if row['phone_number']])
+        ).values_list('email', 'phone_number'):
+            taken.update([email, phone_number])
+        taken.discard(None)
+        users, roles = [], []
+        for row, password in zip(batch, hashes):
+            if row['email'] in taken or row['phone_number'] in taken:
+                self.reject(row['line_number'],
+                            f"user {row['email']} already exists")
+                continue
+            users.append(CustomUser(
+                email=row['email'], password=password,
+                first_name=row['first_name'], last_name=row['last_name'],
+                phone_number=row['phone_number']))
+            roles.append(row['role'])
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+            Profile.objects.bulk_create(
+                Profile(user=user, role=role)
+                for user, role in zip(users, roles))
+        self.created += len(users)
+        if self.verbosity >= 2:
+            self.stdout.write(f"{self.created} users imported...")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from home.models import ProjectSummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the dashboard summaries of every project (or of the "
+        "given projects) from their tasks, members and documents."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'project_ids', nargs='*', type=int,
+            help="Projects to rebuild (default: all).")
+
+    def handle(self, *args, **options):
+        count = ProjectSummary.rebuild(options['project_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {count} project summaries."))
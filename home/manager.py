@@ -1,4 +1,8 @@
+from collections import Counter
+
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models, transaction
+from django.db.models import Count
 
 
 class CustomUserManager(BaseUserManager):
@@ -24,3 +28,63 @@ class CustomUserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", True)
         extra_fields.setdefault("is_active", True)
         return self.create_user(email, password, **extra_fields)
+
+
+class NotificationQuerySet(models.QuerySet):
+    """
+    Keeps ``NotificationCounter`` and the live streams in step with the
+    bulk paths that bypass ``save()``/``delete()`` on single
+    notifications.
+    """
+
+    def unread_by_user(self):
+        return dict(
+            self.filter(read=False).order_by()
+            .values_list('user_id').annotate(count=Count('pk'))
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .models import NotificationCounter
+        from .pubsub import publish_notifications
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            NotificationCounter.adjust(
+                Counter(obj.user_id for obj in objs if not obj.read))
+            publish_notifications(objs)
+        return objs
+
+    def delete(self):
+        from .models import NotificationCounter
+        with transaction.atomic(using=self.db):
+            unread = self.unread_by_user()
+            result = super().delete()
+            NotificationCounter.adjust(
+                {user_id: -count for user_id, count in unread.items()})
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def mark_read(self):
+        """
+        Mark the notifications read with a single UPDATE and return how
+        many changed.
+        """
+        from .models import NotificationCounter
+        with transaction.atomic(using=self.db):
+            unread = self.unread_by_user()
+            updated = self.filter(read=False).update(read=True)
+            NotificationCounter.adjust(
+                {user_id: -count for user_id, count in unread.items()})
+        return updated
+
+    mark_read.alters_data = True
+
+
+class TimelineEventQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .pubsub import publish_timeline_events
+        objs = super().bulk_create(objs, *args, **kwargs)
+        publish_timeline_events(objs)
+        return objs
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache_utils import delete_now_and_on_commit
+from .models import Project
+
+
+KEY_PREFIX = 'home:membership:'
+
+
+def _cache():
+    return caches[getattr(settings, 'HOME_MEMBERSHIP_CACHE', 'default')]
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def _pk(obj):
+    return int(getattr(obj, 'pk', obj))
+
+
+def project_ids_for(user):
+    """
+    Return the ids of the projects ``user`` (a user or user id) is a team
+    member of, as a frozenset.
+
+    The set is read from the membership table once and then served from
+    the cache until a ``team_member`` change invalidates it.
+    """
+    user_id = _pk(user)
+    cache = _cache()
+    project_ids = cache.get(_key(user_id))
+    if project_ids is None:
+        project_ids = frozenset(
+            Project.team_member.through.objects.filter(
+                customuser_id=user_id
+            ).values_list('project_id', flat=True)
+        )
+        cache.set(
+            _key(user_id), project_ids,
+            getattr(settings, 'HOME_MEMBERSHIP_TIMEOUT', 60 * 60)
+        )
+    return project_ids
+
+
+def is_member(user, project):
+    """
+    Return True if ``user`` is in the team of ``project``. Both arguments
+    may be instances or primary keys.
+    """
+    return _pk(project) in project_ids_for(user)
+
+
+def invalidate(user_ids):
+    """
+    Drop the cached memberships of ``user_ids``.
+    """
+    delete_now_and_on_commit(
+        _cache(), [_key(user_id) for user_id in user_ids])
@@ -0,0 +1,75 @@
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+
+re_accepts_br = _lazy_re_compile(r'\bbr\b')
+
+
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress responses of at least ``HOME_COMPRESS_MIN_SIZE`` bytes, and
+    streaming responses as they stream, with brotli when the client
+    accepts it and the package is installed, with gzip otherwise.
+
+    Range responses, event streams and file responses are left alone:
+    their bodies are partial, must reach the client unbuffered, or are
+    better sent by the server's sendfile.
+    """
+
+    # Fast levels; dynamic responses are compressed on every request.
+    brotli_quality = 4
+
+    def skip(self, response):
+        if response.status_code == 206 or response.has_header(
+                'Content-Range'):
+            return True
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return True
+        if getattr(response, 'file_to_stream', None) is not None:
+            return True
+        return not response.streaming and len(response.content) < getattr(
+            settings, 'HOME_COMPRESS_MIN_SIZE', 1024)
+
+    def process_response(self, request, response):
+        if self.skip(response):
+            return response
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (brotli is None or getattr(response, 'is_async', False)
+                or response.has_header('Content-Encoding')
+                or not re_accepts_br.search(accept_encoding)):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = _brotli_sequence(
+                response.streaming_content, self.brotli_quality)
+            del response.headers['Content-Length']
+        else:
+            compressed_content = brotli.compress(
+                response.content, quality=self.brotli_quality)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -1,7 +1,13 @@
-from django.db import models
-from PIL import Image
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
-from .manager import CustomUserManager
+from django.contrib.postgres.search import SearchVectorField
+from .manager import CustomUserManager, NotificationQuerySet
+from .manager import TimelineEventQuerySet
+from .storage import document_storage
 
 
 class CustomUser(AbstractBaseUser, PermissionsMixin):
@@ -16,6 +22,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
+    # Bumped when a claim embedded in issued JWTs changes, which
+    # invalidates those tokens (see home/authentication.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -25,6 +34,32 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save handler spot changes to token claims.
+        if {'is_active', 'is_superuser', 'is_staff'} <= \
+                instance.__dict__.keys():
+            instance._loaded_claims = instance.claims_key
+        return instance
+
+    @property
+    def claims_key(self):
+        return (self.is_active, self.is_superuser, self.is_staff)
+
+    def save(self, *args, **kwargs):
+        # token_version only changes through bump_token_version; a copy
+        # loaded before a bump must not write the old version back and
+        # revive the tokens it revoked.
+        if not self._state.adding and kwargs.get('update_fields') is None \
+                and not args and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'token_version'
+                and field.attname not in deferred]
+        super().save(*args, **kwargs)
+
     def has_prem(self, perm, obj=None):
         return self.is_superuser
 
@@ -51,16 +86,42 @@ class Profile(models.Model):
     role = models.CharField(
         max_length=10, choices=ROLE_CHOICES, default='developer')
 
+    # SHA-256 of the image the derivatives were last made from
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
+
     def __str__(self):
         return f'{self.user.username}'
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        img = Image.open(self.image.path)
-        if img.height > 300 or img.width > 300:
-            output_size = (300, 300)
-            img.thumbnail(output_size)
-            img.save(self.image.path)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save handlers tell whether the image was replaced
+        # and whether the role (a token claim) changed.
+        instance._loaded_image = instance.__dict__.get('image')
+        if 'role' in instance.__dict__:
+            instance._loaded_role = instance.role
+        return instance
+
+    @property
+    def image_changed(self):
+        loaded = getattr(self, '_loaded_image', None)
+        return str(self.image or '') != str(loaded or '')
+
+    def image_url(self, size):
+        """
+        URL of the derivative closest to ``size`` pixels, or of the
+        original until the derivatives have been made.
+        """
+        from .images import derivative_name
+        if not self.image:
+            return None
+        if not self.image_hash:
+            return self.image.url
+        sizes = sorted(
+            getattr(settings, 'HOME_PROFILE_IMAGE_SIZES', (64, 128, 300)))
+        size = next((s for s in sizes if s >= size), sizes[-1])
+        return self.image.storage.url(
+            derivative_name(self.image_hash, size))
 
 
 class Project(models.Model):
@@ -70,10 +131,18 @@ class Project(models.Model):
     start_date = models.DateTimeField(auto_now_add=True)
     end_date = models.DateTimeField(blank=True, null=True)
     team_member = models.ManyToManyField(CustomUser, related_name="projects")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            # Due/overdue scan
+            models.Index(fields=['end_date'], name='project_end_date_idx',
+                         condition=models.Q(end_date__isnull=False)),
+        ]
+
 
 class Task(models.Model):
 
@@ -100,19 +169,41 @@ class Task(models.Model):
     assigned_by = models.ForeignKey(CustomUser, null=True,
                                     on_delete=models.SET_NULL,
                                     related_name='assigned_tasks')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the signal handlers move the task between summary counts.
+        if {'project_id', 'status', 'assignee_id'} <= instance.__dict__.keys():
+            instance._loaded_summary_key = instance.summary_key
+        # Lets the signal handlers reach the team of the previous project.
+        if 'project_id' in instance.__dict__:
+            instance._loaded_project_id = instance.project_id
+        return instance
+
+    @property
+    def summary_key(self):
+        return (self.project_id, self.status, self.assignee_id)
+
     @property
     def get_comments(self):
         return self.comments.all()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'status'],
+                         name='task_project_status_idx'),
+        ]
+
 
 class Document(models.Model):
     name = models.CharField(max_length=10, blank=False)
     description = models.TextField(max_length=500, blank=True)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=document_storage)
     version = models.FloatField(default=1.0)
     project = models.ForeignKey(
         Project, on_delete=models.CASCADE, related_name="documents")
@@ -120,6 +211,74 @@ class Document(models.Model):
     def __str__(self):
         return f"{self.name} (v{self.version})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save handlers release the blob of a replaced file
+        # and move the document between project summaries.
+        if 'file' in instance.__dict__:
+            instance._loaded_file = str(instance.file or '')
+        if 'project_id' in instance.__dict__:
+            instance._loaded_project_id = instance.project_id
+        return instance
+
+
+class StoredBlob(models.Model):
+    """
+    Reference count of a stored document file, by storage name.
+
+    Blobs whose count has dropped to zero are deleted by
+    ``collect_unreferenced_blobs``.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    @classmethod
+    def adjust(cls, name, delta):
+        if not name or not delta:
+            return
+        cls.objects.bulk_create([cls(name=name)], ignore_conflicts=True)
+        cls.objects.filter(name=name).update(
+            ref_count=models.F('ref_count') + delta,
+            updated_at=timezone.now())
+
+    @classmethod
+    def touch(cls, name):
+        """
+        Restart the grace period of ``name``, which an upload is about to
+        reuse before its document row bumps the count.
+        """
+        cls.objects.filter(name=name).update(updated_at=timezone.now())
+
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload that becomes a ``Document`` once all of
+    its bytes have arrived.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                             related_name='upload_sessions')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE,
+                                related_name='upload_sessions')
+    name = models.CharField(max_length=10, blank=False)
+    description = models.TextField(max_length=500, blank=True)
+    version = models.FloatField(default=1.0)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Optional checksum the client expects the finished file to have
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
 
 class Comment(models.Model):
     text = models.TextField(max_length=500, blank=False, null=True)
@@ -128,11 +287,43 @@ class Comment(models.Model):
     author = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="comments")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.author.email} - {self.task.title}"
 
 
+class SearchEntry(models.Model):
+    """
+    Searchable text of a task, comment or document (see home/search.py).
+
+    ``vector`` is only filled on PostgreSQL, where it has a GIN index;
+    other databases are searched with an in-memory inverted index.
+    """
+    KIND_CHOICES = [
+        ('task', 'Task'),
+        ('comment', 'Comment'),
+        ('document', 'Document'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    project = models.ForeignKey(Project, on_delete=models.CASCADE,
+                                related_name='search_entries')
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    vector = SearchVectorField(null=True, editable=False)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'],
+                                    name='search_entry_object_unique'),
+        ]
+
+
 class TimelineEvent(models.Model):
     ACTION_CHOICES = [
         ('task_created', 'Task Created'),
@@ -149,9 +340,61 @@ class TimelineEvent(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TimelineEventQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.action} by {self.user.email} on {self.created_at}"
 
+    class Meta:
+        indexes = [
+            # Timeline feed, per project and overall
+            models.Index(fields=['project', '-created_at', '-id'],
+                         name='timeline_project_feed_idx'),
+            models.Index(fields=['-created_at', '-id'],
+                         name='timeline_feed_idx'),
+        ]
+
+
+class ProjectDeadlineNotice(models.Model):
+    """
+    Records that the team of a project was told it is due or overdue on
+    a given day, so ``check_overdue_projects`` notifies it once per day.
+    """
+    KIND_CHOICES = [
+        ('due', 'Due'),
+        ('overdue', 'Overdue'),
+    ]
+    project = models.ForeignKey(Project, on_delete=models.CASCADE,
+                                related_name='deadline_notices')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    date = models.DateField()
+
+    def __str__(self):
+        return f"{self.project_id} {self.kind} on {self.date}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'date'],
+                                    name='unique_project_deadline_notice'),
+        ]
+
+
+class PendingTaskUpdate(models.Model):
+    """
+    Updates to a task that are waiting to be written out as a single
+    timeline event and notification by ``flush_task_update``.
+    """
+    task = models.OneToOneField(Task, on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='pending_update')
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL,
+                             null=True)
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.count} pending update(s) to task {self.task_id}"
+
 
 class Notification(models.Model):
     user = models.ForeignKey(CustomUser,
@@ -161,8 +404,238 @@ class Notification(models.Model):
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = NotificationQuerySet.as_manager()
+
     def __str__(self):
         return f"Notification for {self.user.username} - {self.message}"
 
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        if not self.read:
+            NotificationCounter.adjust({self.user_id: -1})
+        return result
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Notification feed, and the unread part of it
+            models.Index(fields=['user', '-created_at', '-id'],
+                         name='notification_feed_idx'),
+            models.Index(fields=['user', '-created_at', '-id'],
+                         name='notification_unread_idx',
+                         condition=models.Q(read=False)),
+        ]
+
+
+class NotificationCounter(models.Model):
+    """
+    Denormalized number of unread notifications of a user, so the badge
+    count is read without touching the notification table.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='notification_counter')
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.unread} unread for user {self.user_id}"
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Add ``deltas`` ({user_id: change}) to the unread counters.
+
+        Users without a counter row get one computed from their
+        notifications instead, which already include the change.
+        """
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        existing = set(cls.objects.filter(
+            user_id__in=deltas).values_list('user_id', flat=True))
+        missing = [user_id for user_id in deltas if user_id not in existing]
+        if missing:
+            cls.rebuild(missing)
+
+        by_delta = {}
+        for user_id in existing:
+            by_delta.setdefault(deltas[user_id], []).append(user_id)
+        for delta, user_ids in by_delta.items():
+            cls.objects.filter(user_id__in=user_ids).update(
+                unread=models.F('unread') + delta)
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        Create the counters of ``user_ids`` from their notifications.
+        """
+        unread = dict(
+            Notification.objects.filter(user_id__in=user_ids, read=False)
+            .order_by().values_list('user_id')
+            .annotate(count=models.Count('pk'))
+        )
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, unread=unread.get(user_id, 0))
+             for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        return unread
+
+    @classmethod
+    def for_user(cls, user):
+        unread = cls.objects.filter(user_id=user.pk).values_list(
+            'unread', flat=True).first()
+        if unread is None:
+            unread = cls.rebuild([user.pk]).get(user.pk, 0)
+        return unread
+
+
+class ProjectSummary(models.Model):
+    """
+    Denormalized dashboard counts of a project, so the summary is read
+    with one primary-key lookup however many tasks the project has.
+
+    ``status_counts`` maps task status to count and ``assignee_counts``
+    assignee profile id (``'unassigned'`` for none) to count.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE,
+                                   primary_key=True, related_name='summary')
+    task_count = models.IntegerField(default=0)
+    status_counts = models.JSONField(default=dict)
+    assignee_counts = models.JSONField(default=dict)
+    member_count = models.IntegerField(default=0)
+    document_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of project {self.project_id}"
+
+    @staticmethod
+    def assignee_key(assignee_id):
+        return 'unassigned' if assignee_id is None else str(assignee_id)
+
+    @staticmethod
+    def _add(counts, key, delta):
+        counts[key] = counts.get(key, 0) + delta
+        if not counts[key]:
+            del counts[key]
+
+    @classmethod
+    def adjust_tasks(cls, changes):
+        """
+        Apply ``changes``, an iterable of ``((project_id, status,
+        assignee_id), delta)``, to the task counts.
+
+        Projects without a summary row get one computed from their tasks
+        instead, which already include the change.
+        """
+        by_project = {}
+        for (project_id, status, assignee_id), delta in changes:
+            if delta:
+                by_project.setdefault(project_id, []).append(
+                    (status, assignee_id, delta))
+        if not by_project:
+            return
+        with transaction.atomic():
+            summaries = list(cls.objects.select_for_update().filter(
+                project_id__in=by_project).order_by('pk'))
+            missing = set(by_project) - {summary.project_id
+                                         for summary in summaries}
+            if missing:
+                cls.rebuild(missing)
+            for summary in summaries:
+                for status, assignee_id, delta in by_project[
+                        summary.project_id]:
+                    summary.task_count += delta
+                    cls._add(summary.status_counts, status, delta)
+                    cls._add(summary.assignee_counts,
+                             cls.assignee_key(assignee_id), delta)
+                summary.updated_at = timezone.now()
+            cls.objects.bulk_update(summaries, [
+                'task_count', 'status_counts', 'assignee_counts',
+                'updated_at'])
+
+    @classmethod
+    def adjust_documents(cls, deltas):
+        """
+        Add ``deltas`` ({project_id: change}) to the document counts.
+        """
+        deltas = {project_id: delta for project_id, delta in deltas.items()
+                  if delta}
+        if not deltas:
+            return
+        existing = set(cls.objects.filter(
+            project_id__in=deltas).values_list('project_id', flat=True))
+        missing = set(deltas) - existing
+        if missing:
+            cls.rebuild(missing)
+        for project_id in existing:
+            cls.objects.filter(project_id=project_id).update(
+                document_count=models.F('document_count')
+                + deltas[project_id],
+                updated_at=timezone.now())
+
+    @classmethod
+    def refresh_member_counts(cls, project_ids):
+        """
+        Recount the team members of ``project_ids``.
+        """
+        project_ids = set(project_ids)
+        if not project_ids:
+            return
+        counts = dict(
+            Project.team_member.through.objects
+            .filter(project_id__in=project_ids).order_by()
+            .values_list('project_id').annotate(count=models.Count('pk'))
+        )
+        existing = set(cls.objects.filter(
+            project_id__in=project_ids).values_list('project_id', flat=True))
+        missing = project_ids - existing
+        if missing:
+            cls.rebuild(missing)
+        for project_id in existing:
+            cls.objects.filter(project_id=project_id).update(
+                member_count=counts.get(project_id, 0),
+                updated_at=timezone.now())
+
+    @classmethod
+    def rebuild(cls, project_ids=None):
+        """
+        Compute the summaries of ``project_ids`` (every project when None)
+        from one GROUP BY over their tasks, plus the member and document
+        counts. Returns the number of summaries written.
+        """
+        projects = Project.objects.all()
+        tasks = Task.objects.all()
+        members = Project.team_member.through.objects.all()
+        documents = Document.objects.all()
+        if project_ids is not None:
+            projects = projects.filter(pk__in=project_ids)
+            tasks = tasks.filter(project_id__in=project_ids)
+            members = members.filter(project_id__in=project_ids)
+            documents = documents.filter(project_id__in=project_ids)
+
+        summaries = {project_id: cls(project_id=project_id)
+                     for project_id in projects.values_list('pk', flat=True)}
+        task_rows = (tasks.order_by()
+                     .values_list('project_id', 'status', 'assignee_id')
+                     .annotate(count=models.Count('pk')))
+        for project_id, status, assignee_id, count in task_rows:
+            summary = summaries[project_id]
+            summary.task_count += count
+            cls._add(summary.status_counts, status, count)
+            cls._add(summary.assignee_counts, cls.assignee_key(assignee_id),
+                     count)
+        for field, queryset in (('member_count', members),
+                                ('document_count', documents)):
+            rows = (queryset.order_by().values_list('project_id')
+                    .annotate(count=models.Count('pk')))
+            for project_id, count in rows:
+                setattr(summaries[project_id], field, count)
+
+        cls.objects.bulk_create(
+            summaries.values(), update_conflicts=True,
+            unique_fields=['project'],
+            update_fields=['task_count', 'status_counts', 'assignee_counts',
+                           'member_count', 'document_count', 'updated_at'])
+        return len(summaries)
@@ -0,0 +1,141 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Notification, PendingTaskUpdate, Project, TimelineEvent
+
+
+def notify_project_members(project_id, message):
+    """
+    Create one notification per team member of ``project_id``.
+
+    The member ids are read straight from the membership table and the
+    rows go in with a single ``bulk_create`` instead of one INSERT per
+    member.
+    """
+    member_ids = Project.team_member.through.objects.filter(
+        project_id=project_id
+    ).values_list('customuser_id', flat=True)
+    return Notification.objects.bulk_create(
+        [Notification(user_id=user_id, message=message)
+         for user_id in member_ids],
+        batch_size=getattr(settings, 'HOME_NOTIFICATION_BATCH_SIZE', 1000),
+    )
+
+
+def schedule_project_notification(project_id, message):
+    """
+    Fan ``message`` out to the team of ``project_id`` once the current
+    transaction commits.
+
+    With ``HOME_NOTIFICATION_FANOUT_ASYNC`` the insert is handed to a
+    Celery worker, so the request that saved the task does not wait on
+    the size of the team.
+    """
+    if getattr(settings, 'HOME_NOTIFICATION_FANOUT_ASYNC', False):
+        from .tasks import notify_project_members_task
+        transaction.on_commit(
+            lambda: notify_project_members_task.delay(project_id, message))
+    else:
+        transaction.on_commit(
+            lambda: notify_project_members(project_id, message))
+
+
+def log_task_update(task, user_id, count=1):
+    """
+    Write the timeline event and member notifications for ``count``
+    updates to ``task``.
+    """
+    suffix = f" ({count} changes)" if count > 1 else ""
+    TimelineEvent.objects.create(
+        project_id=task.project_id,
+        user_id=user_id,
+        action='task_updated',
+        description=f"Task '{task.title}' was updated{suffix}."
+    )
+    schedule_project_notification(
+        task.project_id,
+        f"Task '{task.title}' has been updated{suffix}."
+    )
+
+
+def log_task_batch(tasks, user_id, action):
+    """
+    Write one timeline event and one notification per member for each
+    project touched by a batch of ``tasks``, instead of one per task.
+    ``action`` is ``'created'`` or ``'updated'``.
+    """
+    titles = defaultdict(list)
+    for task in tasks:
+        titles[task.project_id].append(task.title)
+    events = []
+    for project_id, project_titles in titles.items():
+        count = len(project_titles)
+        noun = 'task' if count == 1 else 'tasks'
+        verb = 'was' if count == 1 else 'were'
+        listed = ', '.join(f"'{title}'" for title in project_titles[:5])
+        if count > 5:
+            listed += f" and {count - 5} more"
+        events.append(TimelineEvent(
+            project_id=project_id,
+            user_id=user_id,
+            action=f'task_{action}',
+            description=f"{count} {noun} {verb} {action}: {listed}."
+        ))
+        schedule_project_notification(
+            project_id, f"{count} {noun} {verb} {action}: {listed}.")
+    TimelineEvent.objects.bulk_create(events)
+
+
+def record_task_update(task):
+    """
+    Coalesce an update to ``task`` with the other updates made to it
+    within ``HOME_TASK_UPDATE_COALESCE_WINDOW`` seconds.
+
+    The first update in a window adds a ``PendingTaskUpdate`` row and
+    schedules ``flush_task_update``; later ones only bump its counter, so
+    a burst of edits produces one timeline event and one notification per
+    member. A window of 0 logs every update straight away.
+    """
+    window = getattr(settings, 'HOME_TASK_UPDATE_COALESCE_WINDOW', 0)
+    if not window:
+        log_task_update(task, task.assigned_by_id)
+        return
+
+    pending = PendingTaskUpdate.objects.filter(task_id=task.pk)
+    if pending.update(count=F('count') + 1, user_id=task.assigned_by_id):
+        return
+    try:
+        with transaction.atomic():
+            PendingTaskUpdate.objects.create(
+                task_id=task.pk, user_id=task.assigned_by_id)
+    except IntegrityError:
+        # Another request opened the window first.
+        pending.update(count=F('count') + 1, user_id=task.assigned_by_id)
+        return
+
+    from .tasks import flush_task_update
+    transaction.on_commit(
+        lambda: flush_task_update.apply_async((task.pk,), countdown=window))
+
+
+def flush_pending_task_update(task_id):
+    """
+    Write out and clear the pending updates of ``task_id``. Returns the
+    number of updates that were coalesced.
+    """
+    with transaction.atomic():
+        pending = (
+            PendingTaskUpdate.objects.select_for_update()
+            .select_related('task')
+            .filter(task_id=task_id)
+            .first()
+        )
+        if pending is None:
+            return 0
+        task = pending.task
+        pending.delete()
+        log_task_update(task, pending.user_id, pending.count)
+    return pending.count
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the newest-first feeds (timeline,
+    notifications).
+
+    Rows are ordered by ``(created_at, id)`` and pages are addressed by
+    an opaque cursor on that position rather than an offset. No
+    ``COUNT(*)`` is run, so a page costs the same however deep it is.
+    Clients pick the page size with ``?page_size=`` up to
+    ``HOME_FEED_MAX_PAGE_SIZE``.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'HOME_FEED_MAX_PAGE_SIZE', 100)
+
+    def _get_position_from_instance(self, instance, ordering):
+        # The whole ordering rather than its first field, so positions
+        # are unique and ties on created_at never fall back to offsets.
+        return ','.join(str(getattr(instance, field.lstrip('-')))
+                        for field in ordering)
+
+    def _position_filter(self, position, lookup):
+        """
+        Rows strictly past ``position`` in ``lookup`` ('lt' or 'gt')
+        order: ``a < x or (a == x and b < y)``.
+        """
+        fields = [field.lstrip('-') for field in self.ordering]
+        values = position.split(',')
+        condition = Q()
+        equal = {}
+        for field, value in zip(fields, values):
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset with the position filter on
+        # every ordering field instead of the first one only.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(
+                *[field[1:] if field.startswith('-') else '-' + field
+                  for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            is_reversed = self.ordering[0].startswith('-')
+            lookup = 'lt' if self.cursor.reverse != is_reversed else 'gt'
+            queryset = queryset.filter(
+                self._position_filter(current_position, lookup))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
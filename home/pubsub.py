@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_CHANNEL = 'timeline'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def project_channel(project_id):
+    return f'project:{project_id}'
+
+
+class InProcessSubscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next message; None if ``timeout`` seconds pass first.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker._unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Delivers messages to subscribers in the same process only. Meant for
+    tests and single-process development servers.
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = [subscription
+                             for subscription in self._subscriptions
+                             if channel in subscription.channels]
+        for subscription in subscriptions:
+            # Publishers run in sync code, possibly on another thread.
+            subscription.loop.call_soon_threadsafe(
+                subscription.queue.put_nowait, message)
+
+    async def subscribe(self, channels):
+        subscription = InProcessSubscription(self, channels)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+class RedisSubscription:
+    def __init__(self, client, pubsub):
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self, timeout=None):
+        message = await self.pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisBroker:
+    """
+    Redis pub/sub, so web and worker processes reach every open stream.
+    """
+
+    def __init__(self, url=None):
+        import redis
+        self.url = url or settings.HOME_PUBSUB_REDIS_URL
+        self.prefix = getattr(settings, 'HOME_PUBSUB_PREFIX', 'home:')
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message))
+
+    async def subscribe(self, channels):
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(
+            *[self.prefix + channel for channel in channels])
+        return RedisSubscription(client, pubsub)
+
+
+_broker = None
+
+
+def get_broker():
+    """
+    Return the broker named by ``HOME_PUBSUB_BACKEND``.
+    """
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(
+            settings, 'HOME_PUBSUB_BACKEND', 'home.pubsub.InProcessBroker'))()
+    return _broker
+
+
+def check_broker(app_configs, **kwargs):
+    """
+    System check warning that the in-process broker cannot carry what
+    Celery workers publish (coalesced task updates, fanned-out and
+    overdue notifications) to the web process streams.
+    """
+    from django.core.checks import Warning
+    backend = getattr(
+        settings, 'HOME_PUBSUB_BACKEND', 'home.pubsub.InProcessBroker')
+    if backend != 'home.pubsub.InProcessBroker' or getattr(
+            settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        return []
+    return [Warning(
+        "Events published by Celery workers never reach /api/stream/ "
+        "with the in-process pub/sub broker.",
+        hint="Set PUBSUB_REDIS_URL, or CELERY_TASK_ALWAYS_EAGER for "
+             "single-process setups.",
+        id='home.W001',
+    )]
+
+
+def _publish_on_commit(messages):
+    def publish():
+        broker = get_broker()
+        for channel, message in messages:
+            try:
+                broker.publish(channel, message)
+            except Exception:
+                # A lost push must not fail the write; clients catch up
+                # from the feeds.
+                logger.exception("Could not publish to %s", channel)
+
+    if messages:
+        transaction.on_commit(publish)
+
+
+def publish_notifications(notifications):
+    """
+    Push new notifications to the streams of their users once the
+    current transaction commits.
+    """
+    from .serializers import NotificationSerializer
+    _publish_on_commit([
+        (user_channel(notification.user_id), {
+            'type': 'notification',
+            'data': NotificationSerializer(notification).data,
+        })
+        for notification in notifications
+    ])
+
+
+def publish_timeline_events(events):
+    """
+    Push new timeline events to the members of their projects (and to the
+    superusers' timeline channel) once the current transaction commits.
+    """
+    from .serializers import TimelineEventSerializer
+    messages = []
+    for event in events:
+        message = {
+            'type': 'timeline_event',
+            'data': TimelineEventSerializer(event).data,
+        }
+        messages.append((project_channel(event.project_id), message))
+        messages.append((TIMELINE_CHANNEL, message))
+    _publish_on_commit(messages)
@@ -0,0 +1,46 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+if orjson is not None:
+    # Z suffix for UTC like DRF's encoder; non-str keys are stringified
+    # like json.dumps does.
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    """
+    Encode what orjson does not know natively (Decimal, lazy translation
+    strings, timedelta, querysets...) the way DRF's encoder would.
+    """
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+
+    Indented output (the browsable API, ``Accept: ...; indent=4``) and
+    ``UNICODE_JSON = False`` still go through the stdlib encoder, as does
+    everything when orjson is missing.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        # Keep the output a strict javascript subset, as JSONRenderer does.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
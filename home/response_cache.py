@@ -0,0 +1,140 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .cache_utils import delete_now_and_on_commit
+from .models import Project
+
+
+KEY_PREFIX = 'home:responses:'
+STAFF = 'staff'
+RESOURCES = ('project', 'task')
+
+
+def _cache():
+    return caches[getattr(settings, 'HOME_RESPONSE_CACHE', 'default')]
+
+
+def _version_key(resource, audience):
+    return f'{KEY_PREFIX}version:{resource}:{audience}'
+
+
+def _stats_key(resource, outcome):
+    return f'{KEY_PREFIX}stats:{resource}:{outcome}'
+
+
+def sees_everything(user):
+    """
+    Managers and superusers list every project and task.
+    """
+    return user.is_superuser or user.profile.role == 'manager'
+
+
+def _versions(cache, keys):
+    """
+    Current values of the version ``keys``. A missing version starts at
+    the current time, so an evicted version can never come back with a
+    value older entries were stored under.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _count(cache, resource, outcome):
+    key = _stats_key(resource, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def invalidate(resources, user_ids=(), staff=False):
+    """
+    Drop the cached lists of ``resources`` for ``user_ids`` and, with
+    ``staff``, for every manager and superuser.
+
+    Entries are not deleted: their version key is, so the next read
+    starts a newer version and the old keys stop matching.
+    """
+    audiences = [str(user_id) for user_id in user_ids]
+    if staff:
+        audiences.append(STAFF)
+    delete_now_and_on_commit(_cache(), [
+        _version_key(resource, audience)
+        for resource in resources for audience in audiences])
+
+
+def project_member_ids(project_ids):
+    return list(Project.team_member.through.objects.filter(
+        project_id__in=project_ids
+    ).values_list('customuser_id', flat=True).distinct())
+
+
+def stats():
+    """
+    Hit and miss counts of the response cache, per resource.
+    """
+    cache = _cache()
+    keys = [_stats_key(resource, outcome)
+            for resource in RESOURCES for outcome in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    result = {}
+    for resource in RESOURCES:
+        hits = counts.get(_stats_key(resource, 'hits'), 0)
+        misses = counts.get(_stats_key(resource, 'misses'), 0)
+        result[resource] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+    return result
+
+
+class ResponseCacheMixin:
+    """
+    Viewset mixin caching the data of list responses per user.
+
+    The key covers the user, their role, the path and the query string,
+    plus the list versions of the user and (for managers and superusers)
+    of the staff audience; the signals in ``home.signals`` bump those
+    versions when a project, task, profile or team changes.
+    """
+    response_cache_resource = None
+
+    def list(self, request, *args, **kwargs):
+        resource = self.response_cache_resource
+        user = request.user
+        if resource is None or not user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+
+        cache = _cache()
+        audiences = [str(user.pk)]
+        if sees_everything(user):
+            audiences.append(STAFF)
+        versions = _versions(cache, [_version_key(resource, audience)
+                                     for audience in audiences])
+        query = '&'.join(sorted(request.GET.urlencode().split('&')))
+        raw_key = '|'.join(str(part) for part in (
+            user.pk, user.is_superuser, user.profile.role, request.path,
+            query, *versions))
+        key = (f'{KEY_PREFIX}{resource}:'
+               f'{hashlib.sha256(raw_key.encode()).hexdigest()}')
+
+        data = cache.get(key)
+        if data is not None:
+            _count(cache, resource, 'hits')
+            return Response(data)
+        _count(cache, resource, 'misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(
+                settings, 'HOME_RESPONSE_CACHE_TIMEOUT', 5 * 60))
+        return response
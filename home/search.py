@@ -0,0 +1,227 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.contrib.postgres.search import SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .membership import project_ids_for
+from .models import Comment, Document, SearchEntry, Task
+
+
+TOKEN = re.compile(r'\w+')
+# Matches in the title count this much more than matches in the body,
+# like the A/B weights of the tsvector.
+TITLE_WEIGHT = 2.5
+
+
+def _config():
+    return getattr(settings, 'HOME_SEARCH_CONFIG', 'english')
+
+
+def _use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def create_vector_index(using='default', **kwargs):
+    """
+    post_migrate handler adding the GIN index on ``SearchEntry.vector``.
+
+    It is not declared in ``Meta.indexes`` because only PostgreSQL has
+    GIN; SQLite test databases go without.
+    """
+    from django.db import connections
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS search_entry_vector_idx '
+            f'ON {SearchEntry._meta.db_table} USING gin (vector)')
+
+
+def _task_entry(task):
+    return SearchEntry(kind='task', object_id=task.pk,
+                       project_id=task.project_id, title=task.title,
+                       body=task.description or '')
+
+
+def _comment_entry(comment, project_id):
+    return SearchEntry(kind='comment', object_id=comment.pk,
+                       project_id=project_id, body=comment.text or '')
+
+
+def _document_entry(document):
+    return SearchEntry(kind='document', object_id=document.pk,
+                       project_id=document.project_id, title=document.name,
+                       body=document.description or '')
+
+
+def _save_entries(entries):
+    """
+    Insert or refresh ``entries`` with one upsert, then recompute their
+    vectors on PostgreSQL.
+    """
+    if not entries:
+        return
+    SearchEntry.objects.bulk_create(
+        entries, update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['project', 'title', 'body'])
+    if _use_postgres():
+        config = _config()
+        keys = Q()
+        for entry in entries:
+            keys |= Q(kind=entry.kind, object_id=entry.object_id)
+        SearchEntry.objects.filter(keys).update(vector=(
+            SearchVector('title', weight='A', config=config)
+            + SearchVector('body', weight='B', config=config)))
+
+
+def index_tasks(tasks, moved=()):
+    """
+    Index ``tasks``. The comments of the ``moved`` ones, whose project
+    changed, follow them to the new project in one UPDATE.
+    """
+    _save_entries([_task_entry(task) for task in tasks])
+    task_ids = [task.pk for task in moved]
+    if not task_ids:
+        return
+    # Comments are searched within the project of their task.
+    SearchEntry.objects.filter(
+        kind='comment',
+        object_id__in=Comment.objects.filter(
+            task_id__in=task_ids).values('pk'),
+    ).update(project_id=Subquery(
+        Comment.objects.filter(pk=OuterRef('object_id'))
+        .values('task__project_id')[:1]))
+
+
+def index_comment(comment):
+    project_id = Task.objects.values_list(
+        'project_id', flat=True).get(pk=comment.task_id)
+    _save_entries([_comment_entry(comment, project_id)])
+
+
+def index_document(document):
+    _save_entries([_document_entry(document)])
+
+
+def unindex(kind, object_id):
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild(batch_size=1000):
+    """
+    Re-index every task, comment and document. Returns the entry count.
+    """
+    SearchEntry.objects.all().delete()
+    count = 0
+    sources = [
+        (Task.objects.only('id', 'project_id', 'title', 'description'),
+         _task_entry),
+        (Comment.objects.annotate(project_ref=F('task__project_id'))
+         .only('id', 'text'),
+         lambda comment: _comment_entry(comment, comment.project_ref)),
+        (Document.objects.only('id', 'project_id', 'name', 'description'),
+         _document_entry),
+    ]
+    for queryset, make_entry in sources:
+        batch = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(make_entry(obj))
+            if len(batch) >= batch_size:
+                _save_entries(batch)
+                count += len(batch)
+                batch = []
+        _save_entries(batch)
+        count += len(batch)
+    return count
+
+
+def visible_entries(user):
+    """
+    Entries ``user`` may see, following the viewsets: managers see every
+    task, superusers everything, everyone else their projects' content.
+    """
+    if user.is_superuser:
+        return SearchEntry.objects.all()
+    visible = Q(project_id__in=project_ids_for(user))
+    if user.profile.role == 'manager':
+        visible |= Q(kind='task')
+    return SearchEntry.objects.filter(visible)
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index, used where the database has no full-text
+    search. Entries are ranked by how often the query terms occur in
+    them, title matches counting ``TITLE_WEIGHT`` times.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+
+    def add(self, key, title, body):
+        for weight, text in ((TITLE_WEIGHT, title), (1.0, body)):
+            for term in tokenize(text):
+                postings = self.postings[term]
+                postings[key] = postings.get(key, 0.0) + weight
+
+    def search(self, query):
+        """
+        ``(key, score)`` of the entries containing every term of
+        ``query``, best first.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        matches = None
+        for term in terms:
+            keys = set(self.postings.get(term, ()))
+            matches = keys if matches is None else matches & keys
+        scores = {key: sum(self.postings[term][key] for term in terms)
+                  for key in matches}
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def search(user, query, kinds=None):
+    """
+    Entries visible to ``user`` matching ``query``, best first, each with
+    a ``rank`` attribute.
+    """
+    entries = visible_entries(user)
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+
+    if _use_postgres():
+        search_query = SearchQuery(query, search_type='websearch',
+                                   config=_config())
+        return list(
+            entries.filter(vector=search_query)
+            .annotate(rank=SearchRank(F('vector'), search_query))
+            .order_by('-rank', 'pk')
+            .defer('vector')[:getattr(settings, 'HOME_SEARCH_LIMIT', 100)])
+
+    # Narrow down in SQL to entries containing every term, then rank.
+    terms = set(tokenize(query))
+    for term in terms:
+        entries = entries.filter(Q(title__icontains=term)
+                                 | Q(body__icontains=term))
+    candidates = {entry.pk: entry for entry in entries.defer('vector')}
+    index = InvertedIndex()
+    for entry in candidates.values():
+        index.add(entry.pk, entry.title, entry.body)
+    results = []
+    for pk, score in index.search(query)[
+            :getattr(settings, 'HOME_SEARCH_LIMIT', 100)]:
+        entry = candidates[pk]
+        entry.rank = score
+        results.append(entry)
+    return results
@@ -1,6 +1,15 @@
+import re
+
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
+from .authentication import ClaimsRefreshToken
 from .models import Project, CustomUser, Profile, Task, Document, Comment
-from .models import TimelineEvent, Notification
+from .models import TimelineEvent, Notification, UploadSession
+from .models import ProjectSummary, SearchEntry
 # from django.contrib.auth import authenticate
 
 
@@ -29,6 +38,14 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
 class ProjectSerializer(serializers.ModelSerializer):
     current_user_role = serializers.SerializerMethodField()
 
@@ -44,9 +61,7 @@ class ProjectSerializer(serializers.ModelSerializer):
         )
 
     def get_current_user_role(self, obj):
-        user = self.context['request'].user
-        profile = Profile.objects.get(user=user)
-        return profile.role
+        return self.context['request'].user.profile.role
 
     def validate(self, attrs):
         start_date = attrs.get('start_date')
@@ -61,6 +76,7 @@ class ProjectSerializer(serializers.ModelSerializer):
 
 class ProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer
+    image_urls = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
@@ -68,12 +84,59 @@ class ProfileSerializer(serializers.ModelSerializer):
             'user',
             'role',
             'contact',
+            'image_urls',
         )
 
+    def get_image_urls(self, obj):
+        """
+        URL per derivative size, all pointing at the original until the
+        derivatives have been made.
+        """
+        request = self.context.get('request')
+        urls = {}
+        for size in getattr(settings, 'HOME_PROFILE_IMAGE_SIZES',
+                            (64, 128, 300)):
+            url = obj.image_url(size)
+            if url and request is not None:
+                url = request.build_absolute_uri(url)
+            urls[str(size)] = url
+        return urls
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BatchProjectField(serializers.PrimaryKeyRelatedField):
+    """
+    Project reference that is looked up in the projects the enclosing
+    ``TaskListSerializer`` loaded for the whole batch.
+    """
+
+    def to_internal_value(self, data):
+        projects = getattr(self.root, 'batch_projects', None) or {}
+        project = projects.get(_int_or_none(data))
+        if project is not None:
+            return project
+        return super().to_internal_value(data)
+
+
+class TaskListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # One query for the projects of the batch, not one per task.
+        if isinstance(data, list):
+            project_ids = {_int_or_none(item.get('project'))
+                           for item in data if isinstance(item, dict)}
+            project_ids.discard(None)
+            self.batch_projects = Project.objects.in_bulk(project_ids)
+        return super().to_internal_value(data)
+
 
 class TaskSerializer(serializers.ModelSerializer):
-    project = serializers.PrimaryKeyRelatedField(queryset=Project.objects.all()
-                                                 )
+    project = BatchProjectField(queryset=Project.objects.all())
     project_detail = ProjectSerializer(source='project', read_only=True)
     assigned_by = serializers.StringRelatedField(read_only=True)
 
@@ -88,14 +151,55 @@ class TaskSerializer(serializers.ModelSerializer):
             'assigned_by',
             'status',
         )
+        list_serializer_class = TaskListSerializer
+
+
+class DocumentFileField(serializers.FileField):
+    """
+    File upload that renders as the URL of the document's permission
+    checked ``download`` action, never as the URL of the stored blob.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return reverse('document-download', args=[value.instance.pk],
+                       request=self.context.get('request'))
 
 
 class DocumentSerializer(serializers.ModelSerializer):
+    file = DocumentFileField()
+
     class Meta:
         model = Document
         fields = '__all__'
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = (
+            'id',
+            'project',
+            'name',
+            'description',
+            'version',
+            'filename',
+            'size',
+            'sha256',
+            'offset',
+            'created_at',
+        )
+        read_only_fields = ['offset', 'created_at']
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError(
+                "sha256 must be 64 hexadecimal characters.")
+        return value
+
+
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
@@ -114,6 +218,12 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'message', 'read', 'created_at']
 
+
+class NotificationBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False)
+    before = serializers.DateTimeField(required=False)
+
 # class AssignSerializer(serializers.ModelSerializer):
 #     assignee_id = serializers.IntegerField()
 
@@ -170,3 +280,26 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 #     projects = ProjectSerializer(many=True)
 #     count = serializers.IntegerField()
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='object_id')
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = SearchEntry
+        fields = ('kind', 'id', 'project', 'title', 'body', 'rank')
+
+
+class ProjectSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProjectSummary
+        fields = (
+            'project',
+            'task_count',
+            'status_counts',
+            'assignee_counts',
+            'member_count',
+            'document_count',
+            'updated_at',
+        )
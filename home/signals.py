@@ -1,55 +1,288 @@
 from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
+from django.utils import timezone
 
+from . import membership, response_cache, search
+from .authentication import bump_token_version
 from .models import CustomUser, Profile, TimelineEvent, Task, Notification
+from .models import Comment, Document, NotificationCounter, Project
+from .models import ProjectSummary, StoredBlob
+from .notifications import record_task_update
+from .notifications import schedule_project_notification
+from .pubsub import publish_notifications, publish_timeline_events
+from .tasks import process_profile_image_task
 
 
 @receiver(post_save, sender=CustomUser)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
-    instance.profile.save()
+
+
+@receiver(post_save, sender=Profile)
+def process_profile_image(sender, instance, created, **kwargs):
+    if created or instance.image_changed:
+        profile_id = instance.pk
+        if instance.image_hash:
+            # Serve the new original until its derivatives are made.
+            Profile.objects.filter(pk=profile_id).update(image_hash='')
+            instance.image_hash = ''
+        transaction.on_commit(
+            lambda: process_profile_image_task.delay(profile_id))
+    instance._loaded_image = str(instance.image or '')
 
 
 @receiver(post_save, sender=Task)
 def log_task_creation(sender, instance, created, **kwargs):
     if created:
         TimelineEvent.objects.create(
-            project=instance.project,
-            user=instance.assigned_by,
+            project_id=instance.project_id,
+            user_id=instance.assigned_by_id,
             action='task_created',
             description=f"Task '{instance.title}' was created."
         )
         # Notify all team members
-        for member in instance.project.team_member.all():
-            Notification.objects.create(
-                user=member,
-                message=f"A new task '{instance.title}' has been created."
-            )
-    else:
-        TimelineEvent.objects.create(
-            project=instance.project,
-            user=instance.assigned_by,
-            action='task_updated',
-            description=f"Task '{instance.title}' was updated."
+        schedule_project_notification(
+            instance.project_id,
+            f"A new task '{instance.title}' has been created."
         )
-        for member in instance.project.team_member.all():
-            Notification.objects.create(
-                user=member,
-                message=f"Task '{instance.title}' has been updated."
-            )
+    else:
+        record_task_update(instance)
 
 
 @receiver(post_delete, sender=Task)
-def log_task_deletion(sender, instance, **kwargs):
+def log_task_deletion(sender, instance, origin=None, **kwargs):
+    # Tasks removed because their project is being deleted have nowhere
+    # to log to.
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is Project:
+        return
     TimelineEvent.objects.create(
-        project=instance.project,
-        user=instance.assigned_by,
+        project_id=instance.project_id,
+        user_id=instance.assigned_by_id,
         action='task_deleted',
         description=f"Task '{instance.title}' was deleted."
     )
-    for member in instance.project.team_member.all():
-        Notification.objects.create(
-            user=member,
-            message=f"Task '{instance.title}' has been deleted."
-        )
+    schedule_project_notification(
+        instance.project_id,
+        f"Task '{instance.title}' has been deleted."
+    )
+
+
+@receiver(m2m_changed, sender=Project.team_member.through)
+def invalidate_team_membership(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if reverse:
+        # ``user.projects`` changed: only that user's memberships move.
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            user_ids = [instance.pk]
+        else:
+            return
+    elif action == 'pre_clear':
+        instance._cleared_member_ids = list(
+            instance.team_member.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_cleared_member_ids', [])
+    elif action in ('post_add', 'post_remove'):
+        user_ids = pk_set or []
+    else:
+        return
+    membership.invalidate(user_ids)
+    response_cache.invalidate(response_cache.RESOURCES, user_ids)
+
+
+@receiver(m2m_changed, sender=Project.team_member.through)
+def touch_team_projects(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    # Team changes do not save the project; bump updated_at so
+    # conditional GETs see them, and recount the members.
+    if reverse:
+        if action == 'pre_clear':
+            instance._cleared_project_ids = list(
+                instance.projects.values_list('pk', flat=True))
+            return
+        if action == 'post_clear':
+            project_ids = getattr(instance, '_cleared_project_ids', [])
+        elif action in ('post_add', 'post_remove'):
+            project_ids = pk_set or []
+        else:
+            return
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        project_ids = [instance.pk]
+    else:
+        return
+    if project_ids:
+        Project.objects.filter(pk__in=project_ids).update(
+            updated_at=timezone.now())
+        ProjectSummary.refresh_member_counts(project_ids)
+
+
+@receiver(pre_delete, sender=Project)
+def collect_deleted_project_members(sender, instance, **kwargs):
+    instance._deleted_member_ids = list(
+        instance.team_member.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Project)
+def invalidate_deleted_project_members(sender, instance, **kwargs):
+    member_ids = getattr(instance, '_deleted_member_ids', [])
+    membership.invalidate(member_ids)
+    response_cache.invalidate(response_cache.RESOURCES, member_ids,
+                              staff=True)
+
+
+@receiver(post_save, sender=Project)
+def invalidate_project_responses(sender, instance, created, **kwargs):
+    # A new project has no team yet; adding members invalidates theirs.
+    member_ids = ([] if created else
+                  response_cache.project_member_ids([instance.pk]))
+    response_cache.invalidate(response_cache.RESOURCES, member_ids,
+                              staff=True)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_responses(sender, instance, origin=None, **kwargs):
+    # Project deletion invalidates the lists of its whole team once.
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is Project:
+        return
+    # A task moved to another project leaves the old team's lists too.
+    project_ids = {instance.project_id,
+                   getattr(instance, '_loaded_project_id',
+                           instance.project_id)}
+    response_cache.invalidate(
+        ['task'], response_cache.project_member_ids(project_ids),
+        staff=True)
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_responses(sender, instance, **kwargs):
+    # The role decides what the lists contain and how they render.
+    response_cache.invalidate(response_cache.RESOURCES, [instance.user_id])
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.read:
+        NotificationCounter.adjust({instance.user_id: 1})
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, **kwargs):
+    if created:
+        publish_notifications([instance])
+
+
+@receiver(post_save, sender=TimelineEvent)
+def push_timeline_event(sender, instance, created, **kwargs):
+    if created:
+        publish_timeline_events([instance])
+
+
+@receiver(post_save, sender=Document)
+def reference_document_blob(sender, instance, created, **kwargs):
+    name = str(instance.file or '')
+    if created:
+        StoredBlob.adjust(name, 1)
+    elif hasattr(instance, '_loaded_file') and name != instance._loaded_file:
+        StoredBlob.adjust(name, 1)
+        StoredBlob.adjust(instance._loaded_file, -1)
+    instance._loaded_file = name
+
+
+@receiver(post_delete, sender=Document)
+def release_document_blob(sender, instance, **kwargs):
+    StoredBlob.adjust(str(instance.file or ''), -1)
+
+
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, created, **kwargs):
+    moved = not created and getattr(
+        instance, '_loaded_project_id', None) != instance.project_id
+    search.index_tasks([instance], moved=[instance] if moved else ())
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_save, sender=Document)
+def index_document(sender, instance, **kwargs):
+    search.index_document(instance)
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Document)
+def unindex_object(sender, instance, origin=None, **kwargs):
+    # Entries of a deleted project go with it (on_delete=CASCADE).
+    if getattr(origin, 'model', type(origin)) is Project:
+        return
+    search.unindex(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Task)
+def count_task(sender, instance, created, **kwargs):
+    key = instance.summary_key
+    if created:
+        ProjectSummary.adjust_tasks([(key, 1)])
+    elif hasattr(instance, '_loaded_summary_key'):
+        if key != instance._loaded_summary_key:
+            ProjectSummary.adjust_tasks(
+                [(instance._loaded_summary_key, -1), (key, 1)])
+    # Registered last, so the other Task handlers still see the loaded
+    # values.
+    instance._loaded_summary_key = key
+    instance._loaded_project_id = instance.project_id
+
+
+@receiver(post_delete, sender=Task)
+def uncount_task(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) is Project:
+        return
+    key = getattr(instance, '_loaded_summary_key', instance.summary_key)
+    ProjectSummary.adjust_tasks([(key, -1)])
+
+
+@receiver(post_save, sender=Document)
+def count_document(sender, instance, created, **kwargs):
+    if created:
+        ProjectSummary.adjust_documents({instance.project_id: 1})
+    elif getattr(instance, '_loaded_project_id',
+                 instance.project_id) != instance.project_id:
+        ProjectSummary.adjust_documents(
+            {instance._loaded_project_id: -1, instance.project_id: 1})
+    instance._loaded_project_id = instance.project_id
+
+
+@receiver(post_delete, sender=Document)
+def uncount_document(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) is Project:
+        return
+    ProjectSummary.adjust_documents({instance.project_id: -1})
+
+
+@receiver(post_save, sender=CustomUser)
+def expire_tokens_on_flag_change(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_claims', None)
+    if not created and loaded is not None \
+            and loaded != instance.claims_key:
+        versions = bump_token_version([instance.pk])
+        instance.token_version = versions[instance.pk]
+    instance._loaded_claims = instance.claims_key
+
+
+@receiver(post_save, sender=Profile)
+def expire_tokens_on_role_change(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_role', None)
+    if not created and loaded is not None and loaded != instance.role:
+        versions = bump_token_version([instance.user_id])
+        # Keeps a user cached on the profile in step with the database.
+        if Profile.user.is_cached(instance):
+            instance.user.token_version = versions[instance.user_id]
+    instance._loaded_role = instance.role
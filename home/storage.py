@@ -0,0 +1,79 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the sha256 of its
+    content, e.g. ``documents/blobs/ab/cd/abcd....pdf``.
+
+    Saving content that is already stored returns the existing name
+    without writing anything, so identical uploads share one blob across
+    document versions and projects. Blob lifetimes are tracked by
+    ``StoredBlob``.
+
+    Content carrying a ``sha256`` attribute, such as a finished upload
+    session, is named after it instead of being hashed again.
+    """
+    blob_dir = 'blobs'
+
+    def __init__(self, **kwargs):
+        # Two saves of the same content may race for the same name; both
+        # write identical bytes, so overwriting is harmless.
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def content_name(self, name, digest):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, self.blob_dir, digest[:2],
+                              digest[2:4], digest + extension)
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            hasher = hashlib.sha256()
+            content.seek(0)
+            for chunk in content.chunks():
+                hasher.update(chunk)
+            content.seek(0)
+            digest = hasher.hexdigest()
+
+        name = self.content_name(name, digest)
+        # Touched before the existence check, so the collector either
+        # spares the blob or has already deleted it and it is rewritten.
+        from .models import StoredBlob
+        StoredBlob.touch(name)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+    def content_digest(self, name):
+        """
+        The sha256 ``name`` was stored under, or None for files saved
+        before content addressing.
+        """
+        parts = name.split('/')
+        digest = os.path.splitext(parts[-1])[0]
+        if (len(parts) >= 4 and parts[-4] == self.blob_dir
+                and len(digest) == 64 and parts[-3:-1] == [digest[:2],
+                                                          digest[2:4]]):
+            return digest
+        return None
+
+
+_document_storage = None
+
+
+def document_storage():
+    """
+    Storage of ``Document.file``; a callable so migrations do not capture
+    the storage settings.
+    """
+    global _document_storage
+    if _document_storage is None:
+        _document_storage = ContentAddressedStorage()
+    return _document_storage
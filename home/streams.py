@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .membership import project_ids_for
+from .pubsub import TIMELINE_CHANNEL, get_broker
+from .pubsub import project_channel, user_channel
+
+
+def _authenticator():
+    # The configured JWT authentication, so streams honour the same
+    # checks (token versions in stateless mode) as the API.
+    return api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+
+
+def _authenticate(request):
+    """
+    Authenticate from the Authorization header, or from ``?token=`` since
+    browser EventSource clients cannot set headers. Returns the user and
+    the validated token, or None.
+    """
+    authentication = _authenticator()
+    try:
+        result = authentication.authenticate(request)
+        if result is not None:
+            return result
+        raw_token = request.GET.get('token')
+        if not raw_token:
+            return None
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token), validated_token
+    except (AuthenticationFailed, InvalidToken):
+        return None
+
+
+def _still_valid(validated_token):
+    """
+    Whether the token a stream was opened with is still good: not
+    expired, its user active and, in stateless mode, its version current.
+    """
+    try:
+        validated_token.check_exp()
+        _authenticator().get_user(validated_token)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return False
+    return True
+
+
+def _channels(user):
+    channels = [user_channel(user.pk)]
+    if user.is_superuser:
+        channels.append(TIMELINE_CHANNEL)
+    else:
+        channels.extend(project_channel(project_id)
+                        for project_id in project_ids_for(user))
+    return channels
+
+
+async def _event_stream(channels, validated_token):
+    heartbeat = getattr(settings, 'HOME_STREAM_HEARTBEAT', 15)
+    revalidate = getattr(settings, 'HOME_STREAM_REVALIDATE_INTERVAL', 60)
+    loop = asyncio.get_running_loop()
+    validated_at = loop.time()
+    subscription = await get_broker().subscribe(channels)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            if loop.time() - validated_at >= revalidate:
+                # Ends the stream of a deactivated user or expired token;
+                # the client reconnects with a fresh one, or fails to.
+                if not await sync_to_async(_still_valid)(validated_token):
+                    return
+                validated_at = loop.time()
+            message = await subscription.get(timeout=heartbeat)
+            if message is None:
+                # Keeps proxies from closing an idle connection.
+                yield ': keepalive\n\n'
+                continue
+            yield (f"event: {message['type']}\n"
+                   f"data: {json.dumps(message['data'])}\n\n")
+    finally:
+        await subscription.close()
+
+
+async def event_stream(request):
+    """
+    Server-Sent Events stream of the caller's new notifications and of
+    the timeline events of their projects.
+
+    Needs the ASGI server (``uvicorn core.asgi:application``) and answers
+    501 under WSGI. The project membership is read when the stream opens,
+    so clients reconnect to pick up projects they join later.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI would collect the endless stream into memory, holding a
+        # worker for good.
+        return JsonResponse(
+            {"detail": "Event streams need the ASGI server."}, status=501)
+    result = await sync_to_async(_authenticate)(request)
+    if result is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=401)
+    user, validated_token = result
+    channels = await sync_to_async(_channels)(user)
+    return StreamingHttpResponse(
+        _event_stream(channels, validated_token),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -1,7 +1,20 @@
-from celery import shared_task
+from collections import defaultdict
+from celery import chord, group, shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
 from django.utils import timezone
 from .models import Project, Notification, TimelineEvent
-from datetime import datetime
+from .models import ProjectDeadlineNotice, Profile
+from .models import Document, StoredBlob
+from .storage import document_storage
+from .blacklist import get_blacklist
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from .images import file_digest, make_derivatives
+from datetime import date, datetime, time, timedelta
+from .notifications import flush_pending_task_update
+from .notifications import notify_project_members
 
 
 @shared_task
@@ -10,6 +23,115 @@ def print_heartbeat():
     print(f"[{now}] 🟢 Celery is alive.")
 
 
+def _start_of_day(day):
+    # Range filters on end_date itself (rather than end_date__date) can
+    # use the end_date index.
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _deadline_chunk(today, projects):
+    """
+    Notify the teams of one chunk of due/overdue ``projects`` (dicts with
+    id, title and end_date) that were not notified yet on ``today``.
+    """
+    project_ids = [project['id'] for project in projects]
+    with transaction.atomic():
+        notified = set(ProjectDeadlineNotice.objects.filter(
+            project_id__in=project_ids, date=today
+        ).values_list('project_id', flat=True))
+        fresh = [project for project in projects
+                 if project['id'] not in notified]
+        if not fresh:
+            return
+
+        members = defaultdict(list)
+        for project_id, user_id in Project.team_member.through.objects.filter(
+            project_id__in=[project['id'] for project in fresh]
+        ).values_list('project_id', 'customuser_id'):
+            members[project_id].append(user_id)
+
+        notices = []
+        notifications = []
+        timeline_events = []
+        for project in fresh:
+            end_date = timezone.localtime(project['end_date']).date()
+            if end_date < today:
+                kind = 'overdue'
+                message = f"Project '{project['title']}'(due {end_date})."
+                # Log timeline event (no user, since no manager)
+                timeline_events.append(
+                    TimelineEvent(
+                        project_id=project['id'],
+                        user=None,  # Nullable field, so safe
+                        action='task_updated',  # Using existing choice
+                        description=(
+                            f"Project '{project['title']}' marked as overdue."
+                        )
+                    )
+                )
+            else:
+                kind = 'due'
+                message = (f"Project '{project['title']}' "
+                           f"you’re assigned to is due today.")
+            notices.append(ProjectDeadlineNotice(
+                project_id=project['id'], kind=kind, date=today))
+            notifications.extend(
+                Notification(user_id=user_id, message=message)
+                for user_id in members[project['id']]
+            )
+
+        ProjectDeadlineNotice.objects.bulk_create(notices)
+        Notification.objects.bulk_create(
+            notifications,
+            batch_size=getattr(settings, 'HOME_NOTIFICATION_BATCH_SIZE', 1000)
+        )
+        TimelineEvent.objects.bulk_create(timeline_events)
+
+
+def process_project_deadlines(today, id_gte=None, id_lt=None):
+    """
+    Walk the projects ending on or before ``today`` in primary key order,
+    one chunk of ``HOME_DEADLINE_CHUNK_SIZE`` at a time, and notify the
+    ones not notified yet today. ``id_gte``/``id_lt`` restrict the walk
+    to a range of ids.
+
+    Returns the due and overdue projects seen, as the values of id,
+    title and end_date.
+    """
+    chunk_size = getattr(settings, 'HOME_DEADLINE_CHUNK_SIZE', 500)
+    projects = Project.objects.filter(
+        end_date__isnull=False,
+        end_date__lt=_start_of_day(today + timedelta(days=1))
+    )
+    if id_lt is not None:
+        projects = projects.filter(pk__lt=id_lt)
+    last_id = None if id_gte is None else id_gte - 1
+
+    due_projects = []
+    overdue_projects = []
+    while True:
+        chunk = projects
+        if last_id is not None:
+            chunk = chunk.filter(pk__gt=last_id)
+        chunk = list(
+            chunk.order_by('pk').values('id', 'title', 'end_date')[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1]['id']
+        _deadline_chunk(today, chunk)
+        for project in chunk:
+            if timezone.localtime(project['end_date']).date() < today:
+                overdue_projects.append(project)
+            else:
+                due_projects.append(project)
+
+    return {
+        'due_projects': due_projects,
+        'overdue_projects': overdue_projects,
+    }
+
+
 @shared_task
 def check_overdue_projects():
     """
@@ -17,72 +139,186 @@ def check_overdue_projects():
     details.
     - Overdue: Projects with end_date before today.
     - Due: Projects with end_date equal to today.
+    Each team is notified at most once per day, so reruns and retries of
+    the same day do not notify twice.
     Returns a dictionary with lists of due and overdue projects.
     """
-    today = timezone.now().date()
-    # Fetch current date
-    # Overdue projects: end_date is before today
-    overdue_projects = Project.objects.filter(
-        end_date__isnull=False,
-        end_date__date__lt=today
-    )
+    today = timezone.localdate()
+    result = process_project_deadlines(today)
+    result.update({
+        'due_count': len(result['due_projects']),
+        'overdue_count': len(result['overdue_projects']),
+        'timestamp': timezone.now().isoformat()
+    })
+    return result
 
-    # Due projects: date part of end_date is today
-    due_projects = Project.objects.filter(
-        end_date__isnull=False,
-        end_date__date=today
-    )
-    # Prepare notifications and timeline events
-    notifications = []
-    timeline_events = []
-
-    # Process overdue projects
-    for project in overdue_projects:
-        # Notify team members
-        for member in project.team_member.all():
-            notifications.append(
-                Notification(
-                    user=member,
-                    message=f"Project '{project.title}'(due {
-                        project.end_date.date()})."
-                )
-            )
-        # Log timeline event (no user, since no manager)
-        timeline_events.append(
-            TimelineEvent(
-                project=project,
-                user=None,  # Nullable field, so safe
-                action='task_updated',  # Using existing choice
-                description=f"Project '{project.title}' marked as overdue."
-            )
-        )
-    # Process due projects
-    for project in due_projects:
-        # Notify team members
-        for member in project.team_member.all():
-            notifications.append(
-                Notification(
-                    user=member,
-                    message=f"Project '{
-                        project.title
-                        }' you’re assigned to is due today."
-                )
-            )
 
-    # Bulk create notifications and timeline events
-    Notification.objects.bulk_create(notifications)
-    TimelineEvent.objects.bulk_create(timeline_events)
-
-    # Prepare response
-    result = {
-        'due_projects': list(due_projects.values('id', 'title', 'end_date')),
-        'overdue_projects': list(overdue_projects.values(
-            'id', 'title', 'end_date')),
-        'due_count': due_projects.count(),
-        'overdue_count': overdue_projects.count(),
+@shared_task
+def check_overdue_shard(today, id_gte, id_lt):
+    """
+    Celery task running the due/overdue scan over the projects with ids
+    in ``[id_gte, id_lt)``. ``today`` is an ISO date, fixed by the
+    coordinator so every shard agrees on it.
+    """
+    return process_project_deadlines(
+        date.fromisoformat(today), id_gte, id_lt)
+
+
+@shared_task
+def aggregate_overdue_shards(results):
+    """
+    Chord callback merging the shard results into the same shape
+    ``check_overdue_projects`` returns.
+    """
+    due_projects = [project for result in results
+                    for project in result['due_projects']]
+    overdue_projects = [project for result in results
+                        for project in result['overdue_projects']]
+    return {
+        'due_projects': due_projects,
+        'overdue_projects': overdue_projects,
+        'due_count': len(due_projects),
+        'overdue_count': len(overdue_projects),
         'timestamp': timezone.now().isoformat()
     }
 
-    return result
 
+@shared_task
+def check_overdue_projects_sharded(shards=None):
+    """
+    Celery task coordinating a sharded due/overdue scan.
+
+    Splits the id range of the candidate projects into ``shards`` (default
+    ``HOME_DEADLINE_SHARDS``) and runs ``check_overdue_shard`` over them
+    as a group, with ``aggregate_overdue_shards`` as the chord callback.
+    Returns the id of the chord result.
+    """
+    today = timezone.localdate()
+    shards = shards or getattr(settings, 'HOME_DEADLINE_SHARDS', 1)
+    bounds = Project.objects.filter(
+        end_date__isnull=False,
+        end_date__lt=_start_of_day(today + timedelta(days=1))
+    ).aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        header = [check_overdue_shard.s(today.isoformat(), 0, 0)]
+    else:
+        step = -(-(bounds['high'] - bounds['low'] + 1) // shards)
+        header = [
+            check_overdue_shard.s(today.isoformat(), start, start + step)
+            for start in range(bounds['low'], bounds['high'] + 1, step)
+        ]
+    return chord(group(header))(aggregate_overdue_shards.s()).id
+
+
+@shared_task
+def notify_project_members_task(project_id, message):
+    """
+    Celery task for the deferred notification fan-out of task signals.
+    Returns the number of notifications created.
+    """
+    return len(notify_project_members(project_id, message))
+
+
+@shared_task
+def flush_task_update(task_id):
+    """
+    Celery task that closes a task's update window and writes the
+    coalesced timeline event and notifications.
+    """
+    return flush_pending_task_update(task_id)
+
+
+@shared_task
+def process_profile_image_task(profile_id):
+    """
+    Celery task making the sized derivatives of a profile image.
+
+    Does nothing when the image content hash matches the one the current
+    derivatives were made from. Returns the names written.
+    """
+    profile = Profile.objects.filter(pk=profile_id).only(
+        'image', 'image_hash').first()
+    if profile is None or not profile.image:
+        return []
+    digest = file_digest(profile.image)
+    if digest == profile.image_hash:
+        return []
+    names = make_derivatives(profile.image, digest)
+    # Skip the update if the image was replaced in the meantime; its own
+    # task will record the newer hash.
+    Profile.objects.filter(pk=profile_id, image=profile.image.name).update(
+        image_hash=digest)
+    return names
+
+
+@shared_task
+def collect_unreferenced_blobs():
+    """
+    Celery task deleting document blobs no ``Document`` refers to any
+    more, in chunks of ``HOME_BLOB_GC_CHUNK_SIZE``.
+
+    Blobs are only collected once their count has been zero for
+    ``HOME_BLOB_GC_GRACE`` seconds, which leaves time for an upload that
+    reuses the blob to save its document. Returns the number deleted.
+    """
+    chunk_size = getattr(settings, 'HOME_BLOB_GC_CHUNK_SIZE', 500)
+    cutoff = timezone.now() - timedelta(
+        seconds=getattr(settings, 'HOME_BLOB_GC_GRACE', 60 * 60))
+    storage = document_storage()
+    candidates = StoredBlob.objects.filter(
+        ref_count__lte=0, updated_at__lt=cutoff).order_by('name')
+
+    deleted = 0
+    last_name = ''
+    while True:
+        names = list(candidates.filter(name__gt=last_name).values_list(
+            'name', flat=True)[:chunk_size])
+        if not names:
+            break
+        last_name = names[-1]
+        # Documents that predate reference counting are not counted.
+        referenced = set(Document.objects.filter(file__in=names)
+                         .values_list('file', flat=True))
+        for name in names:
+            if name in referenced:
+                continue
+            # Re-check the count so a blob referenced meanwhile survives.
+            # The file goes while the row is still locked: an upload
+            # touching the blob waits, then finds it gone and rewrites it.
+            with transaction.atomic():
+                if candidates.filter(name=name).delete()[0]:
+                    storage.delete(name)
+                    deleted += 1
+    return deleted
+
+
+@shared_task
+def purge_expired_tokens():
+    """
+    Celery task deleting expired outstanding tokens and their blacklist
+    entries, ``HOME_TOKEN_PURGE_CHUNK_SIZE`` tokens per transaction.
+
+    Expired tokens fail signature checks anyway, so neither table needs
+    them. Returns the number of outstanding tokens deleted.
+    """
+    chunk_size = getattr(settings, 'HOME_TOKEN_PURGE_CHUNK_SIZE', 1000)
+    expired = OutstandingToken.objects.filter(
+        expires_at__lt=timezone.now()).order_by('id')
+    blacklist = get_blacklist()
 
+    deleted = 0
+    last_id = 0
+    while True:
+        ids = list(expired.filter(id__gt=last_id).values_list(
+            'id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        blacklisted = BlacklistedToken.objects.filter(token_id__in=ids)
+        jtis = list(blacklisted.values_list('token__jti', flat=True))
+        with transaction.atomic():
+            blacklisted.delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        blacklist.remove(jtis)
+        deleted += len(ids)
+    return deleted
@@ -1,3 +1,1140 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, clear_url_caches, resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.views.static import serve
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from . import membership, middleware
+from .authentication import ClaimsRefreshToken, ProfileJWTAuthentication
+from .authentication import StatelessJWTAuthentication
+from .blacklist import BloomBlacklist
+from .eager_loading import build_plan
+from .management.commands.check_query_plans import (
+    Command as QueryPlanCommand,
+)
+from .membership import is_member, project_ids_for
+from .middleware import CompressionMiddleware
+from .models import Comment, CustomUser, Document, Notification
+from .models import NotificationCounter, PendingTaskUpdate, Profile, Project
+from .models import ProjectDeadlineNotice, SearchEntry, StoredBlob, Task
+from .models import TimelineEvent, UploadSession
+from .notifications import flush_pending_task_update
+from .notifications import notify_project_members
+from .pagination import FeedCursorPagination
+from .parsers import FastJSONParser
+from .pubsub import check_broker
+from .renderers import FastJSONRenderer
+from .serializers import TaskSerializer
+from .storage import document_storage
+from .streams import _event_stream
+from .tasks import aggregate_overdue_shards, check_overdue_projects
+from .tasks import check_overdue_projects_sharded, check_overdue_shard
+from .tasks import collect_unreferenced_blobs
+from .uploads import parse_content_range, part_path
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = CustomUser.objects.create_user(
+            email='manager@example.com', password='pw')
+        Profile.objects.filter(user=self.manager).update(role='manager')
+        self.manager.refresh_from_db()
+        self.developer = CustomUser.objects.create_user(
+            email='developer@example.com', password='pw')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class TaskResponseCacheTests(APITestCase):
+    def test_moving_a_task_invalidates_the_old_team(self):
+        old = Project.objects.create(title='old')
+        new = Project.objects.create(title='new')
+        old.team_member.add(self.developer)
+        Task.objects.create(title='task', project=old)
+        client = self.client_for(self.developer)
+        self.assertEqual(client.get('/api/task/').data['count'], 1)
+
+        task = Task.objects.get()
+        task.project = new
+        task.save()
+
+        self.assertEqual(client.get('/api/task/').data['count'], 0)
+
+
+class ConditionalGetTests(APITestCase):
+    def test_malformed_pk_is_not_found(self):
+        client = self.client_for(self.manager)
+        for url in ('/api/task/abc/', '/api/projects/abc/',
+                    '/api/comments/abc/'):
+            self.assertEqual(client.get(url).status_code, 404, url)
+
+
+STATELESS = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'home.authentication.StatelessJWTAuthentication'],
+}
+
+
+class MembershipTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(title='project')
+
+    def test_memberships_are_read_once(self):
+        self.project.team_member.add(self.developer)
+        self.assertTrue(is_member(self.developer, self.project))
+        self.assertFalse(is_member(self.manager, self.project))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_member(self.developer.pk, self.project.pk))
+            self.assertFalse(is_member(self.manager.pk, self.project))
+
+    def test_team_changes_invalidate(self):
+        self.assertFalse(is_member(self.developer, self.project))
+        self.project.team_member.add(self.developer)
+        self.assertTrue(is_member(self.developer, self.project))
+        self.developer.projects.remove(self.project)
+        self.assertFalse(is_member(self.developer, self.project))
+        self.project.team_member.add(self.developer)
+        self.project.team_member.clear()
+        self.assertFalse(is_member(self.developer, self.project))
+        self.project.team_member.add(self.developer)
+        self.project.delete()
+        self.assertEqual(project_ids_for(self.developer), frozenset())
+
+    def test_read_inside_the_transaction_is_dropped_on_commit(self):
+        self.assertFalse(is_member(self.developer, self.project))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.project.team_member.add(self.developer)
+            # Another request, still seeing the old team, refills it.
+            cache.set(membership._key(self.developer.pk), frozenset())
+        self.assertFalse(is_member(self.developer, self.project))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(is_member(self.developer, self.project))
+
+
+class NotificationFanOutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(title='project')
+
+    def add_members(self, count):
+        start = CustomUser.objects.count()
+        users = [CustomUser.objects.create_user(
+            email=f'member{start + n}@example.com', password='pw')
+            for n in range(count)]
+        self.project.team_member.add(*users)
+        return users
+
+    def test_members_are_notified_after_commit(self):
+        members = self.add_members(3)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Task.objects.create(title='task', project=self.project)
+        self.assertFalse(Notification.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user_id', flat=True)),
+            sorted(member.pk for member in members))
+
+    @override_settings(HOME_NOTIFICATION_FANOUT_ASYNC=True)
+    def test_fan_out_on_a_worker(self):
+        members = self.add_members(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(title='task', project=self.project)
+        self.assertEqual(
+            Notification.objects.filter(user__in=members).count(), 2)
+
+    def test_queries_do_not_grow_with_the_team(self):
+        def count_queries(members):
+            project = Project.objects.create(title=f'{members} members')
+            project.team_member.add(*[CustomUser.objects.create_user(
+                email=f'{members}.{n}@example.com', password='pw')
+                for n in range(members)])
+            with CaptureQueriesContext(connection) as queries:
+                notify_project_members(project.pk, 'message')
+            self.assertEqual(Notification.objects.filter(
+                user__projects=project).count(), members)
+            return len(queries)
+
+        self.assertEqual(count_queries(10), count_queries(1))
+
+    def test_project_with_tasks_can_be_deleted(self):
+        self.add_members(1)
+        Task.objects.create(title='task', project=self.project)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.delete()
+        self.assertFalse(Task.objects.exists())
+
+
+class TaskUpdateCoalescingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        project = Project.objects.create(title='project')
+        project.team_member.add(self.developer)
+        self.task = Task.objects.create(title='task', project=project)
+
+    def update_events(self):
+        return list(TimelineEvent.objects.filter(
+            action='task_updated').values_list('description', flat=True))
+
+    @override_settings(HOME_TASK_UPDATE_COALESCE_WINDOW=10)
+    def test_burst_is_logged_once(self):
+        with mock.patch('home.tasks.flush_task_update.apply_async') as flush:
+            with self.captureOnCommitCallbacks(execute=True):
+                for status in ('working', 'review', 'waiting_qa'):
+                    self.task.status = status
+                    self.task.save()
+        flush.assert_called_once_with((self.task.pk,), countdown=10)
+        self.assertEqual(PendingTaskUpdate.objects.get().count, 3)
+        self.assertEqual(self.update_events(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_pending_task_update(self.task.pk), 3)
+        self.assertEqual(self.update_events(),
+                         ["Task 'task' was updated (3 changes)."])
+        self.assertFalse(PendingTaskUpdate.objects.exists())
+        self.assertEqual(Notification.objects.filter(
+            message__endswith='(3 changes).').count(), 1)
+        self.assertEqual(flush_pending_task_update(self.task.pk), 0)
+
+    @override_settings(HOME_TASK_UPDATE_COALESCE_WINDOW=0)
+    def test_no_window_logs_every_update(self):
+        for status in ('working', 'review'):
+            self.task.status = status
+            self.task.save()
+        self.assertEqual(self.update_events(),
+                         ["Task 'task' was updated."] * 2)
+        self.assertFalse(PendingTaskUpdate.objects.exists())
+
+
+class OverdueScanTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        start_of_today = timezone.make_aware(
+            datetime.combine(today, datetime.min.time()))
+        self.projects = {}
+        for title, end_date in (
+                ('overdue', start_of_today - timedelta(days=2)),
+                ('due', start_of_today + timedelta(minutes=1)),
+                ('later', start_of_today + timedelta(days=2)),
+                ('open', None)):
+            project = Project.objects.create(title=title, end_date=end_date)
+            project.team_member.add(self.developer, self.manager)
+            self.projects[title] = project
+
+    def assertNotifiedOnce(self):
+        messages = sorted(Notification.objects.filter(
+            user=self.developer).values_list('message', flat=True))
+        self.assertEqual(len(messages), 2)
+        self.assertIn("Project 'due'", messages[0])
+        self.assertIn("Project 'overdue'", messages[1])
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(TimelineEvent.objects.filter(
+            project=self.projects['overdue'], user=None).count(), 1)
+
+    @override_settings(HOME_DEADLINE_CHUNK_SIZE=1)
+    def test_scan_notifies_each_team_once_a_day(self):
+        result = check_overdue_projects()
+        self.assertEqual(result['due_count'], 1)
+        self.assertEqual(result['overdue_count'], 1)
+        self.assertEqual(result['due_projects'][0]['id'],
+                         self.projects['due'].pk)
+        self.assertEqual(result['overdue_projects'][0]['id'],
+                         self.projects['overdue'].pk)
+        self.assertNotifiedOnce()
+
+        # A rerun the same day reports the projects but notifies nobody.
+        self.assertEqual(check_overdue_projects()['overdue_count'], 1)
+        self.assertNotifiedOnce()
+
+    def test_queries_do_not_grow_with_the_projects(self):
+        def count_queries():
+            ProjectDeadlineNotice.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                check_overdue_projects()
+            return len(queries)
+
+        one = count_queries()
+        for n in range(5):
+            project = Project.objects.create(
+                title=f'overdue {n}',
+                end_date=self.projects['overdue'].end_date)
+            project.team_member.add(self.developer)
+        self.assertEqual(count_queries(), one)
+
+    def test_sharded_scan_notifies_each_team_once(self):
+        for shards in (1, 3, 10):
+            with self.subTest(shards=shards):
+                check_overdue_projects_sharded(shards)
+                self.assertNotifiedOnce()
+
+    def test_shards_cover_every_project_once(self):
+        today = timezone.localdate().isoformat()
+        ids = sorted(project.pk for project in self.projects.values())
+        results = [check_overdue_shard(today, start, start + 2)
+                   for start in range(ids[0], ids[-1] + 1, 2)]
+        merged = aggregate_overdue_shards(results)
+        self.assertEqual(merged['due_count'], 1)
+        self.assertEqual(merged['overdue_count'], 1)
+        self.assertEqual(merged['overdue_projects'][0]['id'],
+                         self.projects['overdue'].pk)
+        self.assertNotifiedOnce()
+
+
+class FeedPaginationTests(APITestCase):
+    def walk(self, client, url):
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertFalse(any('COUNT(' in query['sql']
+                                 for query in queries))
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+            if len(ids) == 2:
+                # Rows added while paging do not shift the later pages.
+                Notification.objects.create(
+                    user=self.developer, message='new')
+        return ids
+
+    def test_pages_follow_created_at_then_id(self):
+        Notification.objects.bulk_create(
+            Notification(user=self.developer, message=f'message {n}')
+            for n in range(5))
+        # Equal timestamps, so the id decides the order.
+        Notification.objects.update(created_at=timezone.now())
+        expected = list(Notification.objects.order_by(
+            '-id').values_list('id', flat=True))
+        client = self.client_for(self.developer)
+        ids = self.walk(client, '/api/notifications/?page_size=2')
+        self.assertEqual(ids, expected)
+
+        # And back from the last page.
+        url = '/api/notifications/?page_size=2'
+        while client.get(url).data['next']:
+            url = client.get(url).data['next']
+        ids = []
+        while url:
+            response = client.get(url)
+            ids[:0] = [row['id'] for row in response.data['results']]
+            url = response.data['previous']
+        self.assertEqual(ids, list(Notification.objects.order_by(
+            '-id').values_list('id', flat=True)))
+
+    @mock.patch.object(FeedCursorPagination, 'max_page_size', 2)
+    def test_page_size_is_capped(self):
+        Notification.objects.bulk_create(
+            Notification(user=self.developer, message=f'message {n}')
+            for n in range(3))
+        response = self.client_for(self.developer).get(
+            '/api/notifications/?page_size=100')
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class QueryPlanTests(APITestCase):
+    def test_hot_query_indexes_exist(self):
+        expected = {
+            'home_project': {'project_end_date_idx'},
+            'home_task': {'task_project_status_idx'},
+            'home_timelineevent': {'timeline_project_feed_idx',
+                                   'timeline_feed_idx'},
+            'home_notification': {'notification_feed_idx',
+                                  'notification_unread_idx'},
+        }
+        with connection.cursor() as cursor:
+            for table, names in expected.items():
+                constraints = connection.introspection.get_constraints(
+                    cursor, table)
+                self.assertLessEqual(names, set(constraints), table)
+
+    def test_needs_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+            call_command('check_query_plans', user=self.manager.email)
+
+    @mock.patch.object(connection, 'vendor', 'postgresql')
+    @mock.patch.object(QueryPlanCommand, 'estimated_rows',
+                       lambda self, table: 50000)
+    def test_sequential_scans_fail(self):
+        Project.objects.create(title='project')
+        out = StringIO()
+        with mock.patch('django.db.models.QuerySet.explain',
+                        return_value='Index Scan using x on home_task'):
+            call_command('check_query_plans', user=self.manager.email,
+                         stdout=out)
+        self.assertIn('task: ok', out.getvalue())
+
+        with mock.patch('django.db.models.QuerySet.explain',
+                        return_value='Seq Scan on home_task'):
+            with self.assertRaisesMessage(CommandError, 'task'):
+                call_command('check_query_plans',
+                             user=self.manager.email, stdout=out)
+        self.assertIn('task: sequential scan on home_task', out.getvalue())
+
+
+class UnreadCounterTests(APITestCase):
+    def unread_count(self):
+        return self.client_for(self.developer).get(
+            '/api/notifications/unread_count/').data['unread_count']
+
+    def assertUnread(self, count):
+        self.assertEqual(self.unread_count(), count)
+        self.assertEqual(
+            Notification.objects.filter(
+                user=self.developer, read=False).count(), count)
+
+    def test_counter_follows_every_write_path(self):
+        Notification.objects.create(user=self.developer, message='old')
+        # The first change builds the counter from the notifications.
+        self.assertUnread(1)
+        first = Notification.objects.create(
+            user=self.developer, message='one')
+        self.assertUnread(2)
+        Notification.objects.bulk_create(
+            Notification(user=self.developer, message=f'bulk {n}')
+            for n in range(3))
+        self.assertUnread(5)
+
+        client = self.client_for(self.developer)
+        client.patch(f'/api/notifications/{first.pk}/', {'read': True})
+        self.assertUnread(4)
+        client.patch(f'/api/notifications/{first.pk}/', {'read': False})
+        self.assertUnread(5)
+        client.put(f'/api/notifications/{first.pk}/mark_read/')
+        self.assertUnread(4)
+        client.delete(f'/api/notifications/{first.pk}/')
+        self.assertUnread(4)
+        Notification.objects.filter(user=self.developer).first().delete()
+        self.assertUnread(3)
+
+    def test_count_does_not_read_notifications(self):
+        Notification.objects.create(user=self.developer, message='one')
+        self.unread_count()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.unread_count(), 1)
+        self.assertFalse(any('FROM "home_notification"' in query['sql']
+                             for query in queries))
+
+
+class NotificationBulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.mine = Notification.objects.bulk_create(
+            Notification(user=self.developer, message=f'mine {n}')
+            for n in range(4))
+        self.theirs = Notification.objects.create(
+            user=self.manager, message='theirs')
+        self.client = self.client_for(self.developer)
+
+    def post(self, action, data=None):
+        return self.client.post(f'/api/notifications/{action}/',
+                                data or {}, format='json')
+
+    def unread(self, user):
+        return Notification.objects.filter(user=user, read=False).count()
+
+    def test_mark_all_read(self):
+        self.assertEqual(self.post('mark_all_read').data, {'updated': 4})
+        self.assertEqual(self.unread(self.developer), 0)
+        self.assertEqual(self.unread(self.manager), 1)
+        self.assertEqual(self.post('mark_all_read').data, {'updated': 0})
+        self.assertEqual(NotificationCounter.for_user(self.developer), 0)
+
+    def test_mark_many_read(self):
+        self.assertEqual(self.post('mark_many_read').status_code, 400)
+        response = self.post('mark_many_read', {'ids': [
+            self.mine[0].pk, self.mine[1].pk, self.theirs.pk]})
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(self.unread(self.developer), 2)
+        self.assertEqual(self.unread(self.manager), 1)
+        self.assertEqual(NotificationCounter.for_user(self.developer), 2)
+
+    def test_bulk_delete(self):
+        self.assertEqual(self.post('bulk_delete').status_code, 400)
+        Notification.objects.filter(pk=self.mine[0].pk).update(
+            created_at=timezone.now() - timedelta(days=30))
+        response = self.post('bulk_delete', {
+            'before': timezone.now() - timedelta(days=1)})
+        self.assertEqual(response.data, {'deleted': 1})
+        response = self.post('bulk_delete', {'ids': [
+            self.mine[1].pk, self.theirs.pk]})
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertEqual(self.unread(self.developer), 2)
+        self.assertTrue(Notification.objects.filter(
+            pk=self.theirs.pk).exists())
+        self.assertEqual(NotificationCounter.for_user(self.developer), 2)
+
+    def test_queries_do_not_grow_with_the_notifications(self):
+        def count_queries():
+            Notification.objects.update(read=False)
+            with CaptureQueriesContext(connection) as queries:
+                self.post('mark_all_read')
+            return len(queries)
+
+        one = count_queries()
+        Notification.objects.bulk_create(
+            Notification(user=self.developer, message=f'more {n}')
+            for n in range(20))
+        self.assertEqual(count_queries(), one)
+
+
+class FastJSONTests(TestCase):
+    data = {
+        'decimal': Decimal('1.50'),
+        'when': datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+        'id': uuid.UUID(int=1),
+        'lazy': gettext_lazy('Not found.'),
+        'text': 'caf\u00e9 \u2028',
+        'nested': [{'n': 1}, None, True],
+    }
+
+    def test_renders_like_json_renderer(self):
+        fast = FastJSONRenderer().render(self.data)
+        self.assertEqual(json.loads(fast),
+                         json.loads(JSONRenderer().render(self.data)))
+        self.assertNotIn(b'\xe2\x80\xa8', fast)
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_indented_output(self):
+        rendered = FastJSONRenderer().render(
+            self.data, 'application/json; indent=2')
+        self.assertIn(b'\n  "decimal"', rendered)
+
+    def test_parser(self):
+        parser = FastJSONParser()
+        self.assertEqual(
+            parser.parse(BytesIO('{"a": ["\u00e9"]}'.encode())),
+            {'a': ['\u00e9']})
+        self.assertEqual(
+            parser.parse(BytesIO('{"a": "\u00e9"}'.encode('latin-1')),
+                         parser_context={'encoding': 'latin-1'}),
+            {'a': '\u00e9'})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"a": '))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_renderers', rows=5, iterations=1,
+                     stdout=out)
+        self.assertIn('TaskSerializer (5 rows', out.getvalue())
+        self.assertIn('TimelineEventSerializer (5 rows', out.getvalue())
+
+
+@override_settings(HOME_COMPRESS_MIN_SIZE=200)
+class CompressionTests(TestCase):
+    body = b'{"results": [%s]}' % b','.join([b'{"id": 1}'] * 100)
+
+    def compress(self, response, accept='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_responses_are_compressed(self):
+        response = self.compress(HttpResponse(self.body))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_responses_are_not(self):
+        response = self.compress(HttpResponse(b'{}'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_ranges_and_event_streams_are_not(self):
+        partial = HttpResponse(self.body, status=206)
+        partial['Content-Range'] = f'bytes 0-{len(self.body) - 1}/9999'
+        stream = StreamingHttpResponse(
+            iter([self.body]), content_type='text/event-stream')
+        for response in (partial, stream):
+            self.assertFalse(
+                self.compress(response).has_header('Content-Encoding'))
+
+    def test_streaming_responses_are_compressed(self):
+        response = self.compress(StreamingHttpResponse(iter([self.body])))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            self.body)
+
+    @skipIf(middleware.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        response = self.compress(HttpResponse(self.body), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content),
+                         self.body)
+
+
+class EventStreamTests(APITestCase):
+    def test_refused_under_wsgi(self):
+        self.assertEqual(self.client.get('/api/stream/').status_code, 501)
+
+    async def test_served_under_asgi(self):
+        response = await self.async_client.get('/api/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(REST_FRAMEWORK=STATELESS)
+    async def test_query_token_is_checked_like_the_api(self):
+        token = await sync_to_async(self.revoked_token)()
+        response = await self.async_client.get(
+            '/api/stream/', {'token': str(token)})
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(REST_FRAMEWORK=STATELESS,
+                       HOME_STREAM_REVALIDATE_INTERVAL=0)
+    async def test_open_stream_ends_once_the_token_is_revoked(self):
+        token = await sync_to_async(self.revoked_token)()
+        stream = _event_stream(['user:0'], token)
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+
+    def revoked_token(self):
+        token = ClaimsRefreshToken.for_user(self.developer).access_token
+        profile = Profile.objects.get(user=self.developer)
+        profile.role = 'manager'
+        profile.save()
+        cache.clear()
+        return token
+
+
+class SearchIndexTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.old = Project.objects.create(title='old')
+        self.new = Project.objects.create(title='new')
+        self.task = Task.objects.create(title='task', project=self.old)
+        self.comment = Comment.objects.create(
+            text='hello', task=self.task, author=self.developer)
+
+    def comment_project_id(self):
+        return SearchEntry.objects.get(
+            kind='comment', object_id=self.comment.pk).project_id
+
+    def test_comments_follow_a_moved_task(self):
+        task = Task.objects.get()
+        task.project = self.new
+        task.save()
+        self.assertEqual(self.comment_project_id(), self.new.pk)
+
+    def test_comments_follow_a_batch_move(self):
+        response = self.client_for(self.manager).patch(
+            '/api/task/batch/',
+            [{'id': self.task.pk, 'project': self.new.pk}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.comment_project_id(), self.new.pk)
+
+    def test_unmoved_task_leaves_comments_alone(self):
+        task = Task.objects.get()
+        task.title = 'renamed'
+        with CaptureQueriesContext(connection) as context:
+            task.save()
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "home_searchentry"')])
+
+
+class TaskBatchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(title='project')
+        self.project.team_member.add(self.manager)
+        self.client = self.client_for(self.manager)
+
+    def count_queries(self, method, data):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(
+                '/api/task/batch/', data, format='json')
+        self.assertIn(response.status_code, (200, 201))
+        return len(context.captured_queries), response.data
+
+    def create(self, size):
+        return self.count_queries('post', [
+            {'title': f'task {i}', 'project': self.project.pk}
+            for i in range(size)])
+
+    def test_create_query_count_is_constant(self):
+        # Warm up the rows and cache entries the first batch creates.
+        self.create(1)
+        self.assertEqual(self.create(2)[0], self.create(20)[0])
+
+    def test_update_query_count_is_constant(self):
+        def update(size):
+            tasks = self.create(size)[1]
+            return self.count_queries('patch', [
+                {'id': task['id'], 'status': 'review'} for task in tasks])[0]
+
+        self.assertEqual(update(2), update(20))
+
+
+class BloomBlacklistTests(APITestCase):
+    def blacklist(self, pk):
+        token = OutstandingToken.objects.create(
+            user=self.developer, jti=f'jti-{pk}', token='token',
+            expires_at=timezone.now() + timedelta(days=1))
+        BlacklistedToken.objects.create(id=pk, token=token)
+        return token.jti
+
+    def test_sync_sees_rows_committed_out_of_id_order(self):
+        blacklist = BloomBlacklist()
+        later = self.blacklist(10)
+        self.assertTrue(blacklist.contains(later))
+        # A transaction holding id 5 commits after the one holding 10.
+        earlier = self.blacklist(5)
+        blacklist.synced_at = 0
+        self.assertTrue(blacklist.contains(earlier))
+
+
+class ProfileImageTests(APITestCase):
+    def test_image_urls_fall_back_to_the_original(self):
+        profile = self.developer.profile
+        response = self.client_for(self.developer).get(
+            f'/api/profiles/{profile.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['image_urls'], {
+            '64': 'http://testserver/media/default.jpg',
+            '128': 'http://testserver/media/default.jpg',
+            '300': 'http://testserver/media/default.jpg',
+        })
+
+    def test_image_urls_point_at_the_derivatives(self):
+        profile = self.developer.profile
+        Profile.objects.filter(pk=profile.pk).update(image_hash='abc')
+        response = self.client_for(self.developer).get(
+            f'/api/profiles/{profile.pk}/')
+        self.assertEqual(
+            response.data['image_urls']['128'],
+            'http://testserver/media/profile_pics/derivatives/abc/128.jpg')
+
+    def test_new_image_falls_back_until_processed(self):
+        Profile.objects.filter(user=self.developer).update(image_hash='abc')
+        profile = Profile.objects.get(user=self.developer)
+        profile.image = 'profile_pics/new.jpg'
+        profile.save()
+        self.assertEqual(profile.image_url(128), '/media/profile_pics/new.jpg')
+        self.assertEqual(Profile.objects.get(pk=profile.pk).image_hash, '')
+
+
+class ImportUsersTests(TestCase):
+    def test_rows_too_long_for_their_columns_are_skipped(self):
+        rows = (
+            'email,password,first_name,phone_number\n'
+            'ok@example.com,pw,Ok,0300123456\n'
+            'phone@example.com,pw,Phone,030012345678\n'
+            f'name@example.com,pw,{"x" * 151},\n'
+        )
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', delete=False) as fh:
+            fh.write(rows)
+        self.addCleanup(os.remove, fh.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_users', fh.name, '--workers', '1',
+                     stdout=stdout, stderr=stderr)
+        self.assertEqual(
+            list(CustomUser.objects.values_list('email', flat=True)),
+            ['ok@example.com'])
+        self.assertIn('Line 3: phone_number', stderr.getvalue())
+        self.assertIn('Line 4: first_name', stderr.getvalue())
+        self.assertIn('skipped 2', stdout.getvalue())
+
+
+class BlobCollectionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.storage = document_storage()
+
+    def test_reused_blob_survives_collection(self):
+        name = self.storage.save('documents/a.txt', ContentFile(b'data'))
+        StoredBlob.objects.create(name=name, ref_count=0)
+        StoredBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1))
+
+        # A new upload of the same content, before its document commits.
+        self.assertEqual(
+            self.storage.save('documents/b.txt', ContentFile(b'data')), name)
+
+        self.assertEqual(collect_unreferenced_blobs(), 0)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_stale_blob_is_collected(self):
+        name = self.storage.save('documents/a.txt', ContentFile(b'data'))
+        StoredBlob.objects.create(name=name, ref_count=0)
+        StoredBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(collect_unreferenced_blobs(), 1)
+        self.assertFalse(self.storage.exists(name))
+
+
+class ProjectSummaryTests(APITestCase):
+    def test_summary(self):
+        project = Project.objects.create(title='project')
+        Task.objects.create(title='task', project=project)
+        response = self.client_for(self.manager).get(
+            f'/api/projects/{project.pk}/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['task_count'], 1)
+
+    def test_malformed_pk_is_not_found(self):
+        for user in (self.manager, self.developer):
+            response = self.client_for(user).get(
+                '/api/projects/abc/summary/')
+            self.assertEqual(response.status_code, 404)
+
+
+class ProfileJWTTests(APITestCase):
+    def test_user_and_profile_load_in_one_query(self):
+        token = ClaimsRefreshToken.for_user(self.manager).access_token
+        request = APIRequestFactory().get(
+            '/api/projects/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertNumQueries(1):
+            user, _ = ProfileJWTAuthentication().authenticate(request)
+            self.assertEqual(user.profile.role, 'manager')
+
+    def test_project_list_reads_the_role_once(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(
+            ClaimsRefreshToken.for_user(self.manager).access_token))
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/projects/')
+            self.assertEqual(
+                {row['current_user_role'] for row in response.data['results']},
+                {'manager'})
+            return len(queries)
+
+        Project.objects.create(title='first')
+        cache.clear()
+        one = count_queries()
+        Project.objects.bulk_create(
+            Project(title=f'project {n}') for n in range(5))
+        cache.clear()
+        self.assertEqual(count_queries(), one)
+
+
+class EagerLoadingTests(APITestCase):
+    def list_queries(self, url):
+        cache.clear()
+        # Loaded as ProfileJWTAuthentication does.
+        client = self.client_for(CustomUser.objects.select_related(
+            'profile').get(pk=self.manager.pk))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get(url).status_code, 200)
+        return len(queries)
+
+    def add_task(self, n):
+        project = Project.objects.create(title=f'project {n}')
+        task = Task.objects.create(title=f'task {n}', project=project,
+                                   assigned_by=self.manager)
+        Comment.objects.create(task=task, author=self.manager, text='hi')
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        self.add_task(0)
+        urls = ('/api/task/', '/api/comments/', '/api/profiles/')
+        one = {url: self.list_queries(url) for url in urls}
+        for n in range(1, 5):
+            self.add_task(n)
+            CustomUser.objects.create_user(
+                email=f'user{n}@example.com', password='pw')
+        for url in urls:
+            self.assertEqual(self.list_queries(url), one[url], url)
+
+    def test_plan_joins_nested_relations(self):
+        request = APIRequestFactory().get('/api/task/')
+        request.user = self.manager
+        plan = build_plan(TaskSerializer(context={'request': request}),
+                          Task)
+        self.assertEqual(plan.select, ['project', 'assigned_by'])
+        self.assertIn('project__title', plan.only)
+
+
+class StatelessJWTTests(APITestCase):
+    def authenticate(self, token, method='get'):
+        request = getattr(APIRequestFactory(), method)(
+            '/api/projects/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def assertRevoked(self, token):
+        # Read the version from the database, as another process would.
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed) as context:
+            self.authenticate(token)
+        self.assertEqual(context.exception.detail['code'], 'token_outdated')
+
+    def test_stale_save_does_not_revive_revoked_tokens(self):
+        user = CustomUser.objects.get(pk=self.developer.pk)
+        token = ClaimsRefreshToken.for_user(user).access_token
+        user.is_active = False
+        user.save()
+        self.assertRevoked(token)
+
+        user.last_name = 'Renamed'
+        user.save()
+        self.assertRevoked(token)
+        # Another copy loaded before the bump.
+        self.developer.last_name = 'Stale'
+        self.developer.save()
+        self.assertRevoked(token)
+        self.assertEqual(user.token_version, 1)
+        self.assertEqual(
+            CustomUser.objects.get(pk=user.pk).token_version, 1)
+
+    def test_claims_user_is_built_without_queries(self):
+        token = ClaimsRefreshToken.for_user(self.manager).access_token
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+        self.assertEqual(user.pk, self.manager.pk)
+        self.assertEqual(user.profile.role, 'manager')
+
+    def test_writes_load_the_user(self):
+        token = ClaimsRefreshToken.for_user(self.manager).access_token
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token, method='post')
+        self.assertEqual(user.email, self.manager.email)
+
+    def test_claim_changes_revoke_tokens(self):
+        changes = {
+            'deactivate': lambda user: setattr(user, 'is_active', False),
+            'staff': lambda user: setattr(user, 'is_staff', True),
+            'superuser': lambda user: setattr(user, 'is_superuser', True),
+        }
+        for name, change in changes.items():
+            with self.subTest(name):
+                user = CustomUser.objects.get(pk=self.developer.pk)
+                token = ClaimsRefreshToken.for_user(user).access_token
+                change(user)
+                user.save()
+                self.assertRevoked(token)
+                CustomUser.objects.filter(pk=user.pk).update(
+                    is_active=True, is_staff=False, is_superuser=False)
+
+    def test_role_change_revokes_tokens(self):
+        token = ClaimsRefreshToken.for_user(self.developer).access_token
+        profile = Profile.objects.get(user=self.developer)
+        profile.role = 'manager'
+        profile.save()
+        self.assertRevoked(token)
+
+    def test_other_changes_keep_tokens(self):
+        token = ClaimsRefreshToken.for_user(self.developer).access_token
+        user = CustomUser.objects.get(pk=self.developer.pk)
+        user.first_name = 'Renamed'
+        user.save()
+        cache.clear()
+        self.assertEqual(self.authenticate(token)[0].pk, user.pk)
+
+
+class DocumentTests(APITestCase):
+    content = b'0123456789' * 10
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.project = Project.objects.create(title='project')
+        self.project.team_member.add(self.developer)
+        self.document = Document(name='spec', project=self.project)
+        self.document.file.save('spec.txt', ContentFile(self.content))
+        self.url = f'/api/documents/{self.document.pk}/download/'
+
+    def test_serializer_links_to_the_download_action(self):
+        response = self.client_for(self.developer).get(
+            f'/api/documents/?project={self.project.pk}')
+        self.assertEqual(response.data['results'][0]['file'],
+                         f'http://testserver{self.url}')
+
+    def test_download_needs_membership(self):
+        outsider = CustomUser.objects.create_user(
+            email='outsider@example.com', password='pw')
+        self.assertEqual(
+            self.client_for(outsider).get(self.url).status_code, 403)
+        response = self.client_for(self.developer).get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    @override_settings(DEBUG=True)
+    def test_media_urls_serve_no_documents(self):
+        urls = importlib.reload(importlib.import_module('core.urls'))
+        self.addCleanup(clear_url_caches)
+        self.addCleanup(importlib.reload, urls)
+        clear_url_caches()
+        with self.assertRaises(Resolver404):
+            resolve('/media/' + self.document.file.name)
+        self.assertEqual(resolve('/media/profile_pics/a.jpg').func, serve)
+
+    def download(self, **headers):
+        return self.client_for(self.developer).get(self.url, headers=headers)
+
+    def test_range(self):
+        response = self.download(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[10:20])
+
+    def test_suffix_range(self):
+        response = self.download(Range='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[-5:])
+
+    def test_range_past_the_end(self):
+        response = self.download(Range='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range(self):
+        etag = self.download()['ETag']
+        response = self.download(Range='bytes=0-4', If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.download(Range='bytes=0-4', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_if_none_match(self):
+        etag = self.download()['ETag']
+        self.assertEqual(self.download(If_None_Match=etag).status_code, 304)
+
+    @override_settings(HOME_DOWNLOAD_OFFLOAD='x-accel-redirect')
+    def test_offload_header(self):
+        Document.objects.filter(pk=self.document.pk).update(
+            name='a"b\r\né')
+        response = self.download()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected/' + self.document.file.name)
+        self.assertEqual(
+            response['Content-Disposition'],
+            "attachment; filename*=utf-8''a%22b%0D%0A%C3%A9.txt")
+
+
+class UploadSessionTests(APITestCase):
+    content = bytes(range(100))
+
+    def setUp(self):
+        super().setUp()
+        for setting in ('MEDIA_ROOT', 'HOME_UPLOAD_TEMP_DIR'):
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory)
+            self.enterContext(override_settings(**{setting: directory}))
+        self.project = Project.objects.create(title='project')
+        self.project.team_member.add(self.developer)
+        self.client = self.client_for(self.developer)
+
+    def start(self, **data):
+        response = self.client.post('/api/uploads/', dict({
+            'project': self.project.pk, 'name': 'spec',
+            'filename': 'spec.bin', 'size': len(self.content),
+        }, **data))
+        self.assertEqual(response.status_code, 201)
+        return f"/api/uploads/{response.data['id']}/"
+
+    def put(self, url, start, end):
+        return self.client.put(
+            url, self.content[start:end + 1],
+            content_type='application/octet-stream',
+            headers={'Content-Range':
+                     f'bytes {start}-{end}/{len(self.content)}'})
+
+    def finalize(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url + 'finalize/')
+
+    def test_parse_content_range(self):
+        self.assertEqual(parse_content_range('bytes 0-9/100'), (0, 9, 100))
+        self.assertEqual(parse_content_range('bytes 10-19/*'),
+                         (10, 19, None))
+        for header in (None, '', 'bytes 0-9', 'bytes=0-9/100',
+                       'items 0-9/100', 'bytes -9/100'):
+            self.assertIsNone(parse_content_range(header), header)
+
+    def test_resume_from_offset(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, 39).data['offset'], 40)
+        self.assertEqual(self.client.get(url).data['offset'], 40)
+        response = self.put(url, 0, 39)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 40)
+        self.assertEqual(self.finalize(url).status_code, 400)
+        self.assertEqual(self.put(url, 40, 99).data['offset'], 100)
+
+        session = UploadSession.objects.get()
+        # The digest of the received chunks is reused, not recomputed.
+        with mock.patch('home.storage.hashlib.sha256') as sha256:
+            response = self.finalize(url)
+        sha256.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sha256'],
+                         hashlib.sha256(self.content).hexdigest())
+        document = Document.objects.get()
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.content)
+        self.assertFalse(os.path.exists(part_path(session)))
+        self.assertEqual(self.finalize(url).status_code, 404)
+
+    def test_checksum_mismatch(self):
+        url = self.start(sha256='0' * 64)
+        self.put(url, 0, 99)
+        response = self.finalize(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['sha256'],
+                         hashlib.sha256(self.content).hexdigest())
+        self.assertFalse(Document.objects.exists())
+        self.assertTrue(UploadSession.objects.exists())
+
+    def test_finalize_rechecks_membership(self):
+        url = self.start()
+        self.put(url, 0, 99)
+        self.project.team_member.remove(self.developer)
+        self.assertEqual(self.finalize(url).status_code, 403)
+        self.assertFalse(Document.objects.exists())
+
+
+class PubSubCheckTests(TestCase):
+    @override_settings(HOME_PUBSUB_BACKEND='home.pubsub.InProcessBroker',
+                       CELERY_TASK_ALWAYS_EAGER=False)
+    def test_in_process_broker_with_workers_warns(self):
+        self.assertEqual([warning.id for warning in check_broker(None)],
+                         ['home.W001'])
+
+    @override_settings(HOME_PUBSUB_BACKEND='home.pubsub.InProcessBroker',
+                       CELERY_TASK_ALWAYS_EAGER=True)
+    def test_in_process_broker_with_eager_tasks(self):
+        self.assertEqual(check_broker(None), [])
+
+    @override_settings(HOME_PUBSUB_BACKEND='home.pubsub.RedisBroker',
+                       CELERY_TASK_ALWAYS_EAGER=False)
+    def test_redis_broker(self):
+        self.assertEqual(check_broker(None), [])
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+READ_SIZE = 64 * 1024
+
+# sha256 state per upload session, keyed by session id, as
+# (bytes hashed, hasher). hashlib objects cannot be stored, so a session
+# resumed on another worker re-hashes its part file once.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class IncompleteChunk(Exception):
+    pass
+
+
+def parse_content_range(header):
+    """
+    Return ``(start, end, total)`` from a ``Content-Range`` header, with
+    ``total`` None for ``*``; None if the header is malformed.
+    """
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == '*' else int(total)
+
+
+def part_path(session):
+    return _part_path(session.pk)
+
+
+def _part_path(session_id):
+    return os.path.join(settings.HOME_UPLOAD_TEMP_DIR, f'{session_id}.part')
+
+
+def _hasher_at(session):
+    """
+    A sha256 object fed with the first ``session.offset`` bytes.
+    """
+    with _hashers_lock:
+        entry = _hashers.pop(session.pk, None)
+    if entry is not None and entry[0] == session.offset:
+        return entry[1]
+
+    hasher = hashlib.sha256()
+    remaining = session.offset
+    if remaining:
+        with open(part_path(session), 'rb') as fh:
+            while remaining:
+                chunk = fh.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    return hasher
+
+
+def _remember(session, hasher):
+    with _hashers_lock:
+        _hashers[session.pk] = (session.offset, hasher)
+        while len(_hashers) > getattr(
+                settings, 'HOME_UPLOAD_HASHER_CACHE_SIZE', 256):
+            _hashers.popitem(last=False)
+
+
+def append_chunk(session, stream, length):
+    """
+    Append ``length`` bytes read from ``stream`` to the part file of
+    ``session`` at its current offset, hashing them on the way, and
+    advance the offset. Memory use is bounded by ``READ_SIZE``.
+
+    Raises ``IncompleteChunk`` if the stream ends early; the offset is
+    left alone and the partial bytes are overwritten by the retry.
+    """
+    os.makedirs(settings.HOME_UPLOAD_TEMP_DIR, exist_ok=True)
+    hasher = _hasher_at(session)
+    path = part_path(session)
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as fh:
+        fh.seek(session.offset)
+        fh.truncate()
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(READ_SIZE, remaining))
+            if not chunk:
+                raise IncompleteChunk()
+            fh.write(chunk)
+            hasher.update(chunk)
+            remaining -= len(chunk)
+
+    session.offset += length
+    session.save(update_fields=['offset'])
+    _remember(session, hasher)
+
+
+def digest(session):
+    """
+    Hex sha256 of everything received for ``session``.
+    """
+    return _hasher_at(session).hexdigest()
+
+
+def discard(session):
+    _discard(session.pk)
+
+
+def discard_on_commit(session):
+    """
+    Discard the part file of ``session`` once the surrounding transaction
+    commits; on rollback it is kept so the upload can be finalized again.
+    """
+    session_id = session.pk
+    transaction.on_commit(lambda: _discard(session_id))
+
+
+def _discard(session_id):
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+    try:
+        os.remove(_part_path(session_id))
+    except FileNotFoundError:
+        pass
@@ -1,5 +1,7 @@
 from django.urls import path, include
 from .views import UserRegistrationView, LogOutView
+from .views import ResponseCacheStatsView, SearchView
+from .streams import event_stream
 from rest_framework.routers import DefaultRouter
 from .views import (
      ProjectViewSet,
@@ -9,6 +11,7 @@ from .views import (
      CommentViewSet,
      TimelineEventViewSet,
      NotificationViewSet,
+     UploadSessionViewSet,
      )
 
 from rest_framework_simplejwt.views import (
@@ -20,6 +23,7 @@ router.register(r'projects', ProjectViewSet, basename='project')
 router.register(r'profiles', ProfileViewSet, basename='profile')
 router.register(r'task', TaskViewSet, basename='task')
 router.register(r'documents', DocumentViewSet, basename='document')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
 router.register(r'comments', CommentViewSet, basename='comment')
 router.register(r'timeline', TimelineEventViewSet, basename='timeline')
 router.register(r'notifications', NotificationViewSet, basename='notifications')
@@ -32,6 +36,15 @@ urlpatterns = [
     path('api/logout/',
          LogOutView.as_view(),
          name='user-logout'),
+    path('api/cache/stats/',
+         ResponseCacheStatsView.as_view(),
+         name='response-cache-stats'),
+    path('api/search/',
+         SearchView.as_view(),
+         name='search'),
+    path('api/stream/',
+         event_stream,
+         name='event-stream'),
     path('api/',
          include(router.urls)),
     path('api/token/',
@@ -2,18 +2,36 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import UserSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated
-from rest_framework import viewsets
+from .conditional import ConditionalGetMixin
+from .eager_loading import EagerLoadingMixin
+from .membership import is_member
+from .pagination import FeedCursorPagination
+from .response_cache import ResponseCacheMixin
+from . import response_cache
+from .authentication import ClaimsRefreshToken
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework import mixins, viewsets
 from .serializers import ProjectSerializer, ProfileSerializer, TaskSerializer
 from .serializers import DocumentSerializer, CommentSerializer
 from .serializers import TimelineEventSerializer, NotificationSerializer
+from .serializers import NotificationBulkSerializer, UploadSessionSerializer
+from .serializers import ProjectSummarySerializer, SearchResultSerializer
 # from .utils import get_user_projects
 from .models import Profile, Project, Task, Document, Comment
-from .models import TimelineEvent, Notification
+from .models import TimelineEvent, Notification, NotificationCounter
+from .models import ProjectSummary, SearchEntry, UploadSession
+from . import search, uploads
+from .notifications import log_task_batch
+from .downloads import serve_document
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
 from rest_framework.decorators import action
-from django.shortcuts import get_object_or_404
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.exceptions import ValidationError
 
 # from rest_framework import serializers
 
@@ -53,11 +71,8 @@ class LogOutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh_token"]
-            print(f"Received refresh token: {refresh_token}")
-            token = RefreshToken(refresh_token)
-            print("Before blacklisting:", token)
+            token = ClaimsRefreshToken(refresh_token)
             token.blacklist()
-            print("After blacklisting:", token)
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except KeyError:
             return Response({"detail": "Refresh token is required."},
@@ -68,13 +83,53 @@ class LogOutView(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ResponseCacheStatsView(APIView):
+    """
+    Hit and miss counts of the list response cache, for staff users.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text search over the tasks, comments and documents the
+    caller can see: ``?q=<words>``, optionally ``&type=task,comment``.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "The q parameter is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        kinds = [kind for kind in
+                 request.query_params.get('type', '').split(',') if kind]
+        valid_kinds = {kind for kind, _ in SearchEntry.KIND_CHOICES}
+        if not set(kinds) <= valid_kinds:
+            return Response({
+                "detail": "type must be one of "
+                          f"{', '.join(sorted(valid_kinds))}."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search.search(request.user, query, kinds)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        return paginator.get_paginated_response(
+            SearchResultSerializer(page, many=True).data)
+
+
+class ProjectViewSet(ConditionalGetMixin, ResponseCacheMixin,
+                     EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
+    response_cache_resource = 'project'
 
     def get_queryset(self):
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         if user.is_superuser or profile.role == 'manager':
             return Project.objects.all()
         else:
@@ -84,7 +139,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         user = request.user
         # Check if profile exists and fetch the profile
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         # Check if the user is a manager or superuser
         if not user.is_superuser and profile.role != 'manager':
             return Response({
@@ -102,7 +157,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         project = self.get_object()
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         if profile.role != 'manager' or project.manager != user:
             return Response({
                 "detail": "You do not have permission to update this project"
@@ -112,32 +167,53 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         project = self.get_object()
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         # Check if the user is a manager and part of the project team
-        if profile.role == 'manager' and user in project.team_member.all():
+        if profile.role == 'manager' and is_member(user, project):
             return super().destroy(request, *args, **kwargs)
         else:
             return Response({
                 "detail": "You do not have permission to delete this project"
             }, status=status.HTTP_403_FORBIDDEN)
 
-
-class ProfileViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """
+        Task counts by status and assignee, member and document counts,
+        read from the project's ``ProjectSummary`` row.
+        """
+        try:
+            project_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound
+        user = request.user
+        if not (user.is_superuser or user.profile.role == 'manager'
+                or is_member(user, project_id)):
+            raise NotFound
+        summary = ProjectSummary.objects.filter(
+            project_id=project_id).first()
+        if summary is None:
+            if not ProjectSummary.rebuild([project_id]):
+                raise NotFound
+            summary = ProjectSummary.objects.get(project_id=project_id)
+        return Response(ProjectSummarySerializer(summary).data)
+
+
+class ProfileViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         # Check if the user is a manager or superuser
-        if user.is_superuser or Profile.objects.get(
-                    user=user).role == 'manager':
+        if user.is_superuser or user.profile.role == 'manager':
             return Profile.objects.all()
         else:
             return Profile.objects.filter(user=user)
 
     def destroy(self, request, *args, **kwargs):
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         # Check if the user is a manager or superuser
         if profile.user == user:
             return super().destroy(request, *args, **kwargs)
@@ -148,7 +224,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
 
     def update(self, request, *args, **kwargs):
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         # Check if the user is a manager or superuser
         if profile.user == user:
             return super().update(request, *args, **kwargs)
@@ -158,13 +234,17 @@ class ProfileViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_403_FORBIDDEN)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ConditionalGetMixin, ResponseCacheMixin,
+                  EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    response_cache_resource = 'task'
+    # Tasks render their project through ``project_detail``.
+    conditional_fields = ('updated_at', 'project__updated_at')
 
     def get_queryset(self):
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         if user.is_superuser or profile.role == 'manager':
             return Task.objects.all()
         else:
@@ -173,7 +253,7 @@ class TaskViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         user = request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
 
         if not user.is_superuser and profile.role != 'manager':
             return Response({
@@ -192,10 +272,116 @@ class TaskViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(assigned_by=self.request.user)
 
+    def check_batch_size(self, data):
+        limit = getattr(settings, 'HOME_TASK_BATCH_MAX', 500)
+        if not isinstance(data, list) or not data:
+            raise ValidationError({"detail": "Expected a non-empty list."})
+        if len(data) > limit:
+            raise ValidationError({
+                "detail": f"At most {limit} tasks can be sent at once."})
+
+    def invalidate_batch(self, project_ids):
+        response_cache.invalidate(
+            ['task'], response_cache.project_member_ids(project_ids),
+            staff=True)
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        Create a list of tasks in one transaction, with one INSERT and one
+        timeline event and notification per project.
+        """
+        user = request.user
+        profile = user.profile
+        if not user.is_superuser and profile.role != 'manager':
+            return Response({
+                "detail": "You do not have permission to create a task."
+            }, status=status.HTTP_403_FORBIDDEN)
+        self.check_batch_size(request.data)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        tasks = [Task(**attrs, assignee=profile, assigned_by=user)
+                 for attrs in serializer.validated_data]
+        with transaction.atomic():
+            # bulk_create skips the post_save signals, so the batch is
+            # indexed, logged and invalidated once below.
+            Task.objects.bulk_create(tasks)
+            search.index_tasks(tasks)
+            ProjectSummary.adjust_tasks(
+                (task.summary_key, 1) for task in tasks)
+            log_task_batch(tasks, user.pk, 'created')
+            self.invalidate_batch({task.project_id for task in tasks})
+        return Response(self.get_serializer(tasks, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
+    @batch.mapping.patch
+    def batch_update(self, request):
+        """
+        Apply a list of partial updates, each with the ``id`` of its task,
+        in one transaction with a single ``bulk_update``.
+        """
+        user = request.user
+        profile = user.profile
+        self.check_batch_size(request.data)
+        try:
+            ids = [int(item['id']) for item in request.data]
+        except (TypeError, KeyError, ValueError):
+            raise ValidationError({"detail": "Every update needs an id."})
+        if len(set(ids)) != len(ids):
+            raise ValidationError({"detail": "Task ids must be unique."})
+        serializer = self.get_serializer(
+            data=request.data, many=True, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            # The response renders each task's project.
+            tasks = (self.get_queryset().select_related('project')
+                     .select_for_update(of=('self',)).in_bulk(ids))
+            missing = [pk for pk in ids if pk not in tasks]
+            if missing:
+                return Response({
+                    "detail": "Tasks not found.", "ids": missing
+                }, status=status.HTTP_404_NOT_FOUND)
+            if not user.is_superuser and profile.role != 'manager' and any(
+                    task.assignee_id != profile.pk
+                    for task in tasks.values()):
+                return Response({
+                    "detail": "You do not have permission to update "
+                              "these tasks."
+                }, status=status.HTTP_403_FORBIDDEN)
+
+            # bulk_update does not apply auto_now.
+            now = timezone.now()
+            fields = {'updated_at', 'assigned_by'}
+            loaded_project_ids = {pk: task.project_id
+                                  for pk, task in tasks.items()}
+            project_ids = set(loaded_project_ids.values())
+            summary_changes = [(task.summary_key, -1)
+                               for task in tasks.values()]
+            for pk, attrs in zip(ids, serializer.validated_data):
+                task = tasks[pk]
+                for name, value in attrs.items():
+                    setattr(task, name, value)
+                task.assigned_by = user
+                task.updated_at = now
+                fields.update(attrs)
+            updated = [tasks[pk] for pk in ids]
+            Task.objects.bulk_update(updated, sorted(fields))
+            search.index_tasks(updated, moved=[
+                task for task in updated
+                if task.project_id != loaded_project_ids[task.pk]])
+            summary_changes.extend((task.summary_key, 1) for task in updated)
+            ProjectSummary.adjust_tasks(summary_changes)
+            project_ids.update(task.project_id for task in updated)
+            log_task_batch(updated, user.pk, 'updated')
+            self.invalidate_batch(project_ids)
+        return Response(self.get_serializer(updated, many=True).data)
+
     def update(self, request, *args, **kwargs):
         task = self.get_object()
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         if profile.role != 'manager' and task.assignee != user:
             return Response({
                 "detail": "You do not have permission to update this task"
@@ -208,10 +394,9 @@ class TaskViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         task = self.get_object()
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
         # Check if the user is a manager and part of the project team
-        if profile.role == 'manager' and user in task.project.team_member.all(
-        ):
+        if profile.role == 'manager' and is_member(user, task.project_id):
             return super().destroy(request, *args, **kwargs)
         else:
             return Response({
@@ -245,7 +430,7 @@ class TaskViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_404_NOT_FOUND)
 
         # Optional: Check if assignee user is part of the project
-        if assignee_profile.user not in task.project.team_member.all():
+        if not is_member(assignee_profile.user_id, task.project_id):
             return Response({
                 "detail": "User is not a member of this project."
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -258,8 +443,8 @@ class TaskViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
 
 
-class DocumentViewSet(viewsets.ModelViewSet):
-    document = Document.objects.all()
+class DocumentViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
+    queryset = Document.objects.all()
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated]
 
@@ -270,14 +455,134 @@ class DocumentViewSet(viewsets.ModelViewSet):
         return self.queryset.none()
 
     def perform_create(self, serializer):
-        project_id = self.request.data.get('project')
-        project = get_object_or_404(Project, id=project_id)
-        if self.request.user not in project.team_member.all():
+        project = serializer.validated_data['project']
+        if not is_member(self.request.user, project):
+            raise PermissionDenied("You are not part of this project.")
+        serializer.save()
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Send the document's file to team members, with Range and ETag
+        support; see ``home.downloads``.
+        """
+        document = get_object_or_404(
+            Document.objects.only('id', 'name', 'file', 'project_id'), pk=pk)
+        user = request.user
+        if not (user.is_superuser or is_member(user, document.project_id)):
             raise PermissionDenied("You are not part of this project.")
-        serializer.save(project_id=project_id)
+        return serve_document(request, document)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable document uploads: POST a session, PUT the bytes in order
+    with ``Content-Range: bytes start-end/total``, then POST
+    ``finalize``. GET returns the offset to resume from and DELETE
+    aborts the upload.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        project = serializer.validated_data['project']
+        if not is_member(self.request.user, project):
+            raise PermissionDenied("You are not part of this project.")
+        serializer.save(user=self.request.user)
+
+    def update(self, request, *args, **kwargs):
+        content_range = uploads.parse_content_range(
+            request.headers.get('Content-Range'))
+        if content_range is None:
+            return Response({
+                "detail": "A 'Content-Range: bytes start-end/total' "
+                          "header is required."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        start, end, total = content_range
+        length = end - start + 1
+        try:
+            content_length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            content_length = None
+
+        with transaction.atomic():
+            session = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=kwargs['pk'])
+            if start != session.offset:
+                return Response({
+                    "detail": "Chunk does not start at the current offset.",
+                    "offset": session.offset,
+                }, status=status.HTTP_409_CONFLICT)
+            if (end < start or end >= session.size
+                    or total not in (None, session.size)
+                    or content_length != length):
+                return Response({
+                    "detail": "Content-Range does not match the upload.",
+                    "offset": session.offset,
+                }, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                uploads.append_chunk(session, request.stream, length)
+            except uploads.IncompleteChunk:
+                return Response({
+                    "detail": "The chunk was shorter than its Content-Range.",
+                    "offset": session.offset,
+                }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(session).data)
 
+    def destroy(self, request, *args, **kwargs):
+        session = self.get_object()
+        uploads.discard(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'], url_path='finalize')
+    def finalize(self, request, pk=None):
+        # The session row stays locked until the document commits, so a
+        # concurrent finalize waits and then finds the session gone.
+        with transaction.atomic():
+            session = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=pk)
+            if not is_member(request.user, session.project_id):
+                raise PermissionDenied("You are not part of this project.")
+            if session.offset != session.size:
+                return Response({
+                    "detail": "The upload is not complete.",
+                    "offset": session.offset,
+                }, status=status.HTTP_400_BAD_REQUEST)
+            digest = uploads.digest(session)
+            if session.sha256 and digest != session.sha256:
+                return Response({
+                    "detail": "Checksum mismatch.",
+                    "sha256": digest,
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            document = Document(
+                name=session.name,
+                description=session.description,
+                version=session.version,
+                project_id=session.project_id,
+            )
+            with open(uploads.part_path(session), 'rb') as fh:
+                content = File(fh)
+                content.sha256 = digest
+                document.file.save(session.filename, content, save=False)
+            document.save()
+            uploads.discard_on_commit(session)
+            session.delete()
+
+        data = DocumentSerializer(
+            document, context=self.get_serializer_context()).data
+        return Response(dict(data, sha256=digest),
+                        status=status.HTTP_201_CREATED)
 
-class CommentViewSet(viewsets.ModelViewSet):
+
+class CommentViewSet(ConditionalGetMixin, EagerLoadingMixin,
+                     viewsets.ModelViewSet):
     task = Task.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
@@ -300,14 +605,15 @@ class CommentViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            task = Task.objects.get(id=task_id)
-        except Task.DoesNotExist:
+            project_id = Task.objects.values_list(
+                'project_id', flat=True).get(id=task_id)
+        except (Task.DoesNotExist, ValueError):
             return Response(
                 {"detail": "Task not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        if user.is_superuser or user in task.project.team_member.all():
+        if user.is_superuser or is_member(user, project_id):
             return super().create(request, *args, **kwargs)
 
         return Response(
@@ -320,9 +626,9 @@ class CommentViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     def update(self, request, *args, **kwargs):
-        task = self.get_object()
+        comment = self.get_object()
         user = self.request.user
-        if user.is_superuser or user in task.project.team_member.all():
+        if user.is_superuser or is_member(user, comment.task.project_id):
             return super().update(request, *args, **kwargs)
         return Response(
             {"detail": "You do not have permission to update comments."},
@@ -331,16 +637,15 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, *args, **kwargs):
         comment = self.get_object()
-        task = comment.task
-        project = task.project
+        project_id = comment.task.project_id
         user = self.request.user
-        profile = Profile.objects.get(user=user)
+        profile = user.profile
 
         if (
             user.is_superuser or
-            (profile.role == 'manager' and user in project.team_member.all())
+            (profile.role == 'manager' and is_member(user, project_id))
             or
-            comment.author == user
+            comment.author_id == user.pk
         ):
             return super().destroy(request, *args, **kwargs)
 
@@ -350,29 +655,80 @@ class CommentViewSet(viewsets.ModelViewSet):
         )
 
 
-class TimelineEventViewSet(viewsets.ReadOnlyModelViewSet):
+class TimelineEventViewSet(EagerLoadingMixin,
+                            viewsets.ReadOnlyModelViewSet):
     serializer_class = TimelineEventSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FeedCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return TimelineEvent.objects.all().order_by('-created_at')
-        return TimelineEvent.objects.filter(
-            project__team_member=user).order_by('-created_at')
+            return TimelineEvent.objects.all()
+        return TimelineEvent.objects.filter(project__team_member=user)
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FeedCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         return Notification.objects.filter(user=user)
 
+    def perform_update(self, serializer):
+        was_read = serializer.instance.read
+        notification = serializer.save()
+        if notification.read != was_read:
+            NotificationCounter.adjust(
+                {notification.user_id: -1 if notification.read else 1})
+
     @action(detail=True, methods=['PUT'], url_path='mark_read')
     def mark_read(self, request, pk=None):
         notification = self.get_object()
-        notification.read = True
-        notification.save()
+        Notification.objects.filter(pk=notification.pk).mark_read()
         return Response({'detail': 'Notification marked as read.'})
+
+    @action(detail=False, methods=['get'], url_path='unread_count')
+    def unread_count(self, request):
+        return Response({
+            'unread_count': NotificationCounter.for_user(request.user)
+        })
+
+    def get_bulk_queryset(self, require_filter=False):
+        """
+        The caller's notifications, narrowed by the optional ``ids`` and
+        ``before`` of the request body.
+        """
+        serializer = NotificationBulkSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        if require_filter and not filters:
+            raise ValidationError(
+                {"detail": "Either ids or before is required."})
+        queryset = self.get_queryset()
+        if 'ids' in filters:
+            queryset = queryset.filter(pk__in=filters['ids'])
+        if 'before' in filters:
+            queryset = queryset.filter(created_at__lt=filters['before'])
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='mark_all_read')
+    def mark_all_read(self, request):
+        updated = self.get_bulk_queryset().mark_read()
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'], url_path='mark_many_read')
+    def mark_many_read(self, request):
+        if 'ids' not in request.data:
+            return Response({
+                "detail": "ids is required."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        updated = self.get_bulk_queryset().mark_read()
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'], url_path='bulk_delete')
+    def bulk_delete(self, request):
+        deleted, _ = self.get_bulk_queryset(require_filter=True).delete()
+        return Response({'deleted': deleted})